@@ -1,5 +1,4 @@
 from typing import *
-import PIL.Image
 import bpy
 from bpy import types as blender_types
 import bpy.types
@@ -8,9 +7,10 @@ import argparse
 from pathlib import Path
 import sys
 import math
-import xml.etree.ElementTree as ET 
+import functools
 import re
-import PIL
+import struct
+from dataclasses import dataclass
 
 # Relative imports don't work in blender unfortunately :(
 from src.lib import magic, svg
@@ -24,6 +24,18 @@ from src.lib.error import *
 from src.lib.color import *
 from src.lib import kle_ext as kle
 
+# Matches the names of the keycap meshes, capturing their size in u.
+_keycap_mesh_name_pattern = re.compile(r"^DSA_([0-9]+(?:\.[0-9]+)?)u.*$")
+
+@functools.cache
+def get_internal_asset_path() -> Path:
+    for path_type in ("LOCAL", "SYSTEM", "USER"):
+        path = Path(bpy.utils.resource_path(path_type)) / "datafiles" / "assets"
+        if path.exists():
+            return path
+    assert False
+
+@functools.cache
 def get_modifidier_node_group_safe(name: str) -> bpy.types.NodeTree:
     """
     Access modifier node_group, circumventing the bug of assets not being loaded
@@ -33,26 +45,26 @@ def get_modifidier_node_group_safe(name: str) -> bpy.types.NodeTree:
     
     This code is heavily based on this:
     https://projects.blender.org/blender/blender/issues/117399#issuecomment-1167467
+    
+    The result is cached per name, so the asset library is only loaded once.
     """
     
-    def get_internal_asset_path():
-        for path_type in ("LOCAL", "SYSTEM", "USER"):
-            path = Path(bpy.utils.resource_path(path_type)) / "datafiles" / "assets"
-            if path.exists():
-                return path
-        assert False
+    node_group = bpy.data.node_groups.get(name)
+    if node_group and node_group.type == "GEOMETRY":
+        return node_group
+    
     # TODO: We might not be able to assume that we can easily derive the asset
     # .blend name from the title case human readable name in this way...
     asset_path = str(
         get_internal_asset_path() / "geometry_nodes" / f"{name.lower().replace(" ", "_")}.blend"
     )
-    node_group = bpy.data.node_groups.get(name)
-    if not node_group or node_group.type != "GEOMETRY":
-        print(f"Loading '{name}'...")
-        with bpy.data.libraries.load(asset_path) as (data_from, data_to):
-            data_to.node_groups = [name]
-        node_group = cast(bpy.types.NodeTree, data_to.node_groups[0])
-    return node_group
+    print(f"Loading '{name}'...")
+    with bpy.data.libraries.load(asset_path) as (data_from, data_to):
+        data_to.node_groups = [name]
+    return cast(bpy.types.NodeTree, data_to.node_groups[0])
+
+# Names of the writable properties of each modifier type.
+_writable_modifier_properties: dict[str, list[str]] = {}
 
 def copy_modifiers(source: bpy.types.Object, destination: bpy.types.Object):
     for source_modifier in source.modifiers:
@@ -60,18 +72,79 @@ def copy_modifiers(source: bpy.types.Object, destination: bpy.types.Object):
         if not destination_modifier:
             destination_modifier = destination.modifiers.new(source_modifier.name, source_modifier.type)
 
-        # collect names of writable properties
-        properties = [p.identifier for p in source_modifier.bl_rna.properties
-                        if not p.is_readonly]
+        # collect names of writable properties, which only depend on the type
+        properties = _writable_modifier_properties.get(source_modifier.type)
+        if properties is None:
+            properties = [p.identifier for p in source_modifier.bl_rna.properties
+                            if not p.is_readonly]
+            _writable_modifier_properties[source_modifier.type] = properties
 
         # copy those properties
         for prop in properties:
             setattr(destination_modifier, prop, getattr(source_modifier, prop))
-        destination_modifier = destination
+
+# The local offset (in units) and clockwise rotation (in degrees) of the keycap
+# mesh for each orientation, as `(x, y, rotation)`. Vertical keys are rotated
+# around their top left corner, and so need to be moved one unit to the right.
+_local_key_transforms: dict[Orientation, tuple[float, float, float]] = {
+    Orientation.HORIZONTAL: (0.0, 0.0, 0.0),
+    Orientation.VERTICAL: (1.0, 0.0, 90.0),
+}
+
+@dataclass
+class KeyPlacement():
+    """
+    The precomputed blender transform and texture properties of a single key.
+    """
+    mesh_name: str
+    icon_id: str
+    major_size: float
+    location: tuple[float, float, float]
+    rotation_z: float
+    texture_position: tuple[float, float, float]
+    texture_rotation: float
+
+def compute_key_placement(
+    pos_x: float, pos_y: float, rotation_deg: float,
+    local_x: float, local_y: float, local_rotation_deg: float,
+    unit: float, texture_unit: float, key_unit: float,
+    viewbox_x: float, viewbox_y: float, texture_scale: float,
+) -> tuple[float, float, float, float, float, float]:
+    """
+    Compute the blender placement and texture coordinates of a single key using
+    plain float arithmetic. The rotations are clockwise, in degrees.
+    
+    Returns `(location_x, location_y, rotation_z, texture_x, texture_y,
+    texture_rotation)`, where the location and rotation are in blender's +y up,
+    counter-clockwise coordinate system, and the texture position is in pixels.
+    """
+    rotation_rad = math.radians(rotation_deg)
+    cos, sin = cos_sin(rotation_deg)
+    
+    # The local offset rotated clockwise in blender space (+y up).
+    model_x = local_x * unit
+    model_y = local_y * unit
+    location_x = pos_x * unit + cos * model_x + sin * model_y
+    location_y = -pos_y * unit - sin * model_x + cos * model_y
+    
+    # The local offset rotated clockwise in texture space (+y down).
+    texture_local_x = local_x * texture_unit
+    texture_local_y = local_y * texture_unit
+    texture_x = (cos * texture_local_x - sin * texture_local_y + pos_x * key_unit - viewbox_x) * texture_scale
+    texture_y = (sin * texture_local_x + cos * texture_local_y + pos_y * key_unit - viewbox_y) * texture_scale
+    
+    texture_rotation = rotation_rad + math.radians(local_rotation_deg)
+    
+    return location_x, location_y, -texture_rotation, texture_x, texture_y, texture_rotation
 
 def create_keyboard(texture_path: Path, svg_viewbox: svg.ViewBox, keyboard: kle.ExtendedKeyboard, config: Config, out_path: Path) -> None:
-    with PIL.Image.open(texture_path) as image:
-        texture_size = Vec2(*image.size)
+    # Only read the PNG signature and IHDR chunk, the pixel data is loaded by
+    # blender further down.
+    with open(texture_path, "rb") as file:
+        header = file.read(33)
+    if len(header) < 33 or header[0:8] != b"\x89PNG\r\n\x1a\n" or header[12:16] != b"IHDR":
+        panic(f"Texture '{texture_path}' is not a valid PNG file")
+    texture_size = Vec2[int](*struct.unpack(">II", header[16:24]))
     
     unit = magic.keycap_model_unit_size
     
@@ -129,7 +202,8 @@ def create_keyboard(texture_path: Path, svg_viewbox: svg.ViewBox, keyboard: kle.
         case_object.parent = origin_object
         
         case_mesh = assert_instance(bpy.types.Mesh, case_object.data)
-        case_mesh.materials.append(bpy.data.materials['Case Plastic'])
+        if "Case Plastic" not in case_mesh.materials:
+            case_mesh.materials.append(bpy.data.materials["Case Plastic"])
         color = config.colors[case.color] if case.color in config.colors else HideableColor(case.color)
         case_object["color"] = color[0:3]
         
@@ -163,98 +237,93 @@ def create_keyboard(texture_path: Path, svg_viewbox: svg.ViewBox, keyboard: kle.
     node.image = texture
     
     ## Position keycap mesh origins at their top left corners, to match the SVG.
+    keycap_meshes: dict[str, bpy.types.Mesh] = {}
+    # Several meshes share the same size (e.g. homing variants).
+    translations_by_size: dict[float, mathutils.Matrix] = {}
     for name, mesh in bpy.data.meshes.items():
-        match = re.match(r"^DSA_([0-9]+(?:\.[0-9]+)?)u.*$", name)
+        match = _keycap_mesh_name_pattern.match(name)
         if match is None:
             continue
         size = float(match.group(1))
         
-        unit = magic.keycap_model_unit_size
-        translation = mathutils.Vector((unit / 2 * size, -unit / 2, 0))
+        if (translation := translations_by_size.get(size)) is None:
+            translation = mathutils.Matrix.Translation((unit / 2 * size, -unit / 2, 0))
+            translations_by_size[size] = translation
         
-        mesh.transform(
-            mathutils.Matrix.Translation(translation)
-        )
+        mesh.transform(translation)
+        keycap_meshes[name] = mesh
+    
+    # The objects with the same names as the keycap meshes, which hold the
+    # modifiers that should be copied to every placed key.
+    reference_objects = {
+        name: object
+        for name, object in bpy.data.objects.items()
+        if name in keycap_meshes
+    }
+    
+    # These are the same for every key, so we compute them once up front.
+    vertical_offset = bpy.utils.units.to_value("METRIC", "LENGTH", f"{keyboard.case.vertical_offset_mm} mm")
+    texture_unit_size = config.unit_size * config.texture_scale
+    key_unit_size = config.unit_size + config.icon_margin * 2
+    texture_dimensions = tuple(texture_size)
     
     ## Place keys
-    def place_key(key: KeycapInfo, transform: Transform) -> None:        
-        unit = magic.keycap_model_unit_size
-        
+    # First compute the placement of every key, then create all of the objects
+    # in a single pass.
+    def place_key(key: KeycapInfo, transform: Transform) -> KeyPlacement:
         mesh_name = f"DSA_{key.major_size:g}u"
-        try:
-            mesh = bpy.data.meshes[mesh_name]
-        except KeyError:
+        if mesh_name not in keycap_meshes:
             panic(f"Keycap mesh '{mesh_name}' is not defined") 
         
-        object = bpy.data.objects.new(f"Key_{key.icon_id}", mesh)
-        
-        local_pos = Vec2[float](0, 0)
-        local_rotation_clockwise = Rotation(0)
-        match key.orientation:
-            case Orientation.HORIZONTAL:
-                pass
-            case Orientation.VERTICAL:
-                local_rotation_clockwise += 90
-                local_pos.x += 1
+        local_x, local_y, local_rotation_deg = _local_key_transforms[key.orientation]
         
         pos = transform.get_translation()
-        rotation_clockwise = transform.get_rotation()
-        
-        matrix = mathutils.Matrix.Identity(4)
         
         ## These are not really the local and global transforms, but I don't care
-        # Apply "local" transform
-        matrix = mathutils.Matrix.Rotation(
-            -local_rotation_clockwise.rad(),
-            4,
-            (0, 0, 1)
-        ) @ matrix
-        matrix = mathutils.Matrix.Translation((*(local_pos * unit), 0)) @ matrix
-        
-        # Apply "global" transform
-        matrix = mathutils.Matrix.Rotation(
-            -rotation_clockwise.rad(),
-            4,
-            (0, 0, 1)
-        ) @ matrix
-        matrix = mathutils.Matrix.Translation((*(pos * unit * Vec2(1, -1)), 0))\
-            @ matrix
-        matrix = mathutils.Matrix.Translation((
-            0,
-            0,
-            bpy.utils.units.to_value("METRIC", "LENGTH", f"{keyboard.case.vertical_offset_mm} mm"),
-        )) @ matrix
+        # The "local" transform (rotation then translation) followed by the
+        # "global" transform, composed into a single matrix.
+        location_x, location_y, rotation_z, texture_x, texture_y, texture_rotation = compute_key_placement(
+            pos.x, pos.y, transform.get_rotation().deg,
+            local_x, local_y, local_rotation_deg,
+            unit, config.unit_size, key_unit_size,
+            svg_viewbox.pos.x, svg_viewbox.pos.y, config.texture_scale,
+        )
         
-        object.matrix_world = matrix
-        object.location -= center_position
+        return KeyPlacement(
+            mesh_name=mesh_name,
+            icon_id=key.icon_id,
+            major_size=key.major_size,
+            location=(location_x - center_position.x, location_y - center_position.y, vertical_offset - center_position.z),
+            rotation_z=rotation_z,
+            texture_position=(texture_x, texture_y, 0),
+            texture_rotation=texture_rotation,
+        )
+    
+    # Filter out ghosted keys
+    keys = filter(lambda key: not key.is_ghosted, keyboard.keys)
+    placements = place_keys(keys, 1, place_key)
+    
+    for placement in placements:
+        object = bpy.data.objects.new(f"Key_{placement.icon_id}", keycap_meshes[placement.mesh_name])
+        object.matrix_world = mathutils.Matrix.LocRotScale(
+            placement.location,
+            mathutils.Euler((0, 0, placement.rotation_z)),
+            None,
+        )
         object.parent = origin_object
         
-        
-        texture_local_pos = local_pos * config.unit_size
-        texture_pos_pixels = (
-            rotate(texture_local_pos, Vec2(0, 0), rotation_clockwise.deg) \
-            + transform.get_translation() * (config.unit_size + config.icon_margin * 2) \
-            - svg_viewbox.pos            
-        ) * config.texture_scale
-        
-        object["texture_position_pixels"] = \
-            (*texture_pos_pixels, 0)
+        object["texture_position_pixels"] = placement.texture_position
         # The negation of the counter-clockwise rotation
-        object["texture_rotation"] = -(-rotation_clockwise.rad()) - -local_rotation_clockwise.rad()
-        object["texture_dimensions"] = tuple(texture_size)
-        object["texture_unit_size"] = config.unit_size * config.texture_scale
-        object["unit_size"] = magic.keycap_model_unit_size
-        object["dimensions"] = (unit * key.major_size, unit)
+        object["texture_rotation"] = placement.texture_rotation
+        object["texture_dimensions"] = texture_dimensions
+        object["texture_unit_size"] = texture_unit_size
+        object["unit_size"] = unit
+        object["dimensions"] = (unit * placement.major_size, unit)
 
-        reference_object = bpy.data.objects[mesh_name]
-        copy_modifiers(reference_object, object)
+        copy_modifiers(reference_objects[placement.mesh_name], object)
         
         keys_collection.objects.link(object)
     
-    # Filter out ghosted keys
-    keys = filter(lambda key: not key.is_ghosted, keyboard.keys)
-    place_keys(keys, 1, place_key)
-    
     ## Move viewport to camera
     space = bpy.data.screens['Layout'].areas[3].spaces[0]
     if not isinstance(space, blender_types.SpaceView3D):
@@ -302,7 +371,6 @@ metadata = GenerationMetadata.from_file(directory / "metadata.json5")
 
 layout, theme = metadata.load()
 
-with open(directory / "texture.svg", "r") as file:
-    view_box = svg.tree_get_viewbox(ET.parse(file))
+view_box = svg.file_get_viewbox(directory / "texture.svg")
 
 create_keyboard(directory / "texture.png", view_box, layout, theme, out_path)
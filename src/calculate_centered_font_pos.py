@@ -6,7 +6,6 @@ import pathlib
 import sys
 import argparse
 import xml.etree.ElementTree as ET
-from decimal import Decimal
 
 from .lib.utils import *
 from .lib.error import *
@@ -45,8 +44,8 @@ def main() -> None:
 
     args = parser.parse_args()
     
-    height= Decimal(args.height)
-    font_size = Decimal(args.font_size)
+    height = float(args.height)
+    font_size = float(args.font_size)
     font_family: str = args.family
     font_weight_arg: str|None = args.weight
     
@@ -69,8 +68,8 @@ def main() -> None:
             # TODO: Variable fonts are not supported.
             panic(f"There is no font with weight {font_weight} installed for the family '{font_family}'")
     
-    centered_pos = height / 2 + (font_size * font.metrics.cap_center_offset())
-    cap_height = font_size * font.metrics.cap_height()
+    centered_pos = height / 2 + (font_size * font.metrics.cap_center_offset)
+    cap_height = font_size * font.metrics.cap_height
     
     console.print(f"Glyph 'H' with height [bold cyan]{cap_height}[/bold cyan]")
     console.print(f"should be offset [bold cyan]{centered_pos}[/bold cyan]")
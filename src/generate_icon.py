@@ -25,32 +25,27 @@ def parse_size(size: str) -> Ok[Vec2]|Error[str]:
     if not size.endswith("u"):
         return Error(f"The given keycap size '{size}' is not valid: it must be suffixed with a 'u'.")
     
-    size = size.removesuffix("u")
-    if len(size) == 0:
+    width, separator, height = size[:-1].partition("x")
+    if len(width) == 0 and not separator:
         return Error(f"The given keycap size '{size}' is not valid: no size was given.")
     
+    if "x" in height:
+        return Error(f"The given keycap size '{size}' is not valid: you can not specify more than two dimensions.")
     
-    components = size.split("x")
     try:
-        components = tuple(map(float, components))
+        components = Vec2(float(width), float(height) if separator else 1.0)
     except ValueError:
         return Error(f"The given keycap size '{size}' does not contain valid numbers.")
     
-    # The zero check is to make type inference happy :)
-    if len(components) > 2 or len(components) == 0:
-        return Error(f"The given keycap size '{size}' is not valid: you can not specify more than two dimensions.")
-    
-    if len(components) == 1:
-        components += (1.0,)
-    
-    if components[0] != 1 and components[1] != 1:
+    if components.x != 1 and components.y != 1:
         return Error(f"The given keycap size '{size}' is not valid: neither of it's dimensions are 1u.")
     
-    return Ok(Vec2(*components))
+    return Ok(components)
 
 def generate_svg(size: Vec2, bg_color: str|None, margin: float, font_paths: list[pathlib.Path], theme: Theme, templates: SvgSymbolSet, out_file: TextIO) -> None:
-    font = Font.FontDefinition(font_paths[0])
-    font_rules = (Font.generate_css_rule(Font.FontDefinition(path)) for path in font_paths)
+    fonts = [Font.FontDefinition(path) for path in font_paths]
+    font = fonts[0]
+    font_rules = Font.generate_css_rules(fonts)
     
     builder = SvgDocumentBuilder()\
         .set_viewbox(svg.ViewBox(Vec2(-margin, -margin), (size * 100 + Vec2.promote(margin * 2)).as_scaling()))\
@@ -88,10 +83,11 @@ def generate_svg(size: Vec2, bg_color: str|None, margin: float, font_paths: list
     
     # Margin adjusted to match if unit_size was 100 px. 
     
+    bg_offset = number_to_str(-margin) if margin != 0 else None
     bg_element = make_element("rect", {
         "class": "icon-bg",
-        "x": number_to_str(-margin) if margin != 0 else None,
-        "y": number_to_str(-margin) if margin != 0 else None,
+        "x": bg_offset,
+        "y": bg_offset,
         "width": number_to_str(size.x * 100 + margin * 2),
         "height": number_to_str(size.y * 100 + margin * 2),
         "fill": f"url(#{bg_color or "bg_main"})",
@@ -108,7 +104,9 @@ def generate_svg(size: Vec2, bg_color: str|None, margin: float, font_paths: list
     builder.add_element(bounds_rect)
     
     tree = builder.build()
-    tree.write(out_file, encoding="unicode", xml_declaration=True)
+    # Serialize into a single string first, so that the output stream only
+    # gets a single write.
+    out_file.write("<?xml version='1.0' encoding='utf-8'?>\n" + ET.tostring(tree.getroot(), encoding="unicode"))
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Generate an empty SVG with the given font embedded.")
@@ -6,13 +6,32 @@ import curses
 
 from . import utils, project
 
-_stdout = utils.WriteTracker(sys.stdout)
-_stderr = utils.WriteTracker(sys.stderr)
+# Initialized by `_ensure_init`, the first time an action is started, so that
+# merely importing this module doesn't touch stdio or the terminal.
+_stdout: utils.WriteTracker | None = None
+_stderr: utils.WriteTracker | None = None
+# Moves the cursor up one line and clears it. Resolved once, since the terminal
+# capabilities won't change while running.
+_clear_last_line = ""
 
-sys.stdout = _stdout
-sys.stderr = _stderr
-
-curses.setupterm()
+def _ensure_init() -> None:
+    global _stdout, _stderr, _clear_last_line
+    if _stdout is not None:
+        return
+    
+    _stdout = utils.WriteTracker(sys.stdout)
+    _stderr = utils.WriteTracker(sys.stderr)
+    
+    sys.stdout = cast(TextIO, _stdout)
+    sys.stderr = cast(TextIO, _stderr)
+    
+    curses.setupterm()
+    
+    _clear_last_line = "".join((
+        (curses.tigetstr("cuu1") or bytes()).decode(),
+        "\r",
+        (curses.tigetstr("el") or bytes()).decode(),
+    ))
 
 def get_written_output_length() -> Tuple[int, int]:
     """
@@ -20,6 +39,8 @@ def get_written_output_length() -> Tuple[int, int]:
     this function means that something has been written to stdout or
     stderr since then.
     """
+    if _stdout is None or _stderr is None:
+        return (0, 0)
     return (_stdout.write_amount, _stderr.write_amount)
 
 
@@ -27,11 +48,7 @@ def get_clear_last_progress() -> str:
     if project.verbose():
         return ""
     else:
-        return "".join((
-            (curses.tigetstr("cuu1") or bytes()).decode(),
-            "\r",
-            (curses.tigetstr("el") or bytes()).decode(),
-        ))
+        return _clear_last_line
 
 class Timer():
     def __init__(self, start_time: float | None = None):
@@ -46,6 +63,8 @@ class Timer():
 
 class StartedTimedAction:
     def __init__(self, action: str):
+        _ensure_init()
+        
         self.action = action
         self.timer = Timer()
         
@@ -75,6 +94,7 @@ class ActionProgress(Protocol):
     def render_finished(self) -> str | None: ...
 
 def log_action[P: ActionProgress, R](action: str, function: Callable[[Callable[[P], None]], R]) -> R:
+    _ensure_init()
     timer = StartedTimedAction(action)
     
     last_progress: P | None = None
@@ -7,8 +7,10 @@ import subprocess
 import os
 from pathlib import Path
 from dataclasses import dataclass
-import io
 import zipfile
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 
 from .svg_builder import *
 from .pos import *
@@ -23,9 +25,8 @@ from .color import *
 class ArchiveStep(IntEnum):
     SCANNING_FOR_FONTS = 0
     BUILDING_SVG = 1
-    RENDERING_PRINT = 2
-    RENDERING_OUTLINE = 3
-    BUILDING_OVERVIEW = 4
+    RENDERING = 2
+    BUILDING_OVERVIEW = 3
     
 
 @dataclass
@@ -42,61 +43,132 @@ class ArchiveProgress(action.ActionProgress):
             case ArchiveStep.BUILDING_OVERVIEW:
                 return f"building '{self.filename}'"
             case ArchiveStep.BUILDING_SVG:
-                step_str = "building SVG     "
-            case ArchiveStep.RENDERING_PRINT:
-                step_str = "rendering print  "
-            case ArchiveStep.RENDERING_OUTLINE:
-                step_str = "rendering outline"
+                step_str = "building SVG"
+            case ArchiveStep.RENDERING:
+                step_str = "rendering   "
         return f"icon {self.current_icon + 1} / {self.total_icons} '{self.filename}' {step_str}"
     
     def render_finished(self) -> str | None:
         return f"{self.total_icons} icon(s)"
 
+def _format_position(value: float) -> str:
+    """
+    Format a key position like `f"{value:.3g}"`, with the decimal point replaced
+    by a dash. Positions are usually whole numbers, which are handled directly.
+    """
+    if value.is_integer() and 0 < abs(value) < 1000:
+        return str(int(value))
+    return f"{value:.3g}".replace(".", "-")
+
+# Placeholder visibility of outlines in serialized key documents, which is
+# replaced by the actual visibility of each variant.
+_outline_visibility_placeholder = "kittencaps-outline-visibility"
+_outline_visibility_token = f'visibility="{_outline_visibility_placeholder}"'.encode()
+
+def _render_png(svg_content: bytes | svg.ElementTree, zoom: float, fonts_arguments: list[str]) -> bytes:
+    """
+    Render an SVG with resvg. A tree is serialized directly into resvg's stdin
+    from a separate thread, so that resvg can start parsing while the rest of
+    the document is still being serialized.
+    """
+    arguments = [
+        "resvg",
+        f"--zoom={zoom}",
+        # Note: resvg complains when using stdin without specifying
+        # `--resources-dir` for some reason...
+        "--resources-dir=/dev/null",
+        "-",
+        "-c",
+        *fonts_arguments,
+    ]
+    process = subprocess.Popen(arguments, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    stdin = cast(IO[bytes], process.stdin)
+    stdout = cast(IO[bytes], process.stdout)
+    
+    # Exceptions raised while writing are re-raised in this thread once the
+    # writer is done.
+    writer_error: BaseException | None = None
+    
+    def write_input() -> None:
+        nonlocal writer_error
+        try:
+            if isinstance(svg_content, bytes):
+                stdin.write(svg_content)
+            else:
+                svg_content.write(stdin, encoding="utf-8", xml_declaration=False)
+        except BrokenPipeError:
+            # resvg exited early, which is reported through its exit code below.
+            pass
+        except BaseException as error:
+            writer_error = error
+        finally:
+            # resvg waits for the end of its input, so stdin has to be closed
+            # even if writing failed, or reading its output would never finish.
+            try:
+                stdin.close()
+            except BrokenPipeError:
+                pass
+    
+    writer = threading.Thread(target=write_input)
+    writer.start()
+    image = stdout.read()
+    writer.join()
+    
+    if writer_error is not None:
+        process.wait()
+        raise writer_error
+    
+    if (code := process.wait()) != 0:
+        raise subprocess.CalledProcessError(code, arguments)
+    return image
+
 def package_keycap_icons_archive(
     layout: kle.Keyboard,
     config: Config,
     key_templates: SvgSymbolSet,
+    out_file: IO[bytes],
     *,
     progress_handler: Callable[[ArchiveProgress], None] | None = None,
-) -> io.BytesIO:
+) -> None:
+    """
+    Write a ZIP archive containing the rendered print icons of every key to
+    `out_file`.
+    """
     progress_handler = progress_handler if progress_handler is not None else lambda _: None
+    # The template elements are shared by every key's document, which are
+    # normalized in place, so copy them once up front to not modify the given
+    # templates.
     base_builder = SvgDocumentBuilder()\
         .palette(config.colors)\
-        .add_icon_set(key_templates)
-    
-    file = io.BytesIO()
-    
-    archive = zipfile.ZipFile(file, "w")
-    archive.mkdir("print")
-    archive.mkdir("outlined")
-    
-    progress_handler(ArchiveProgress(
-        ArchiveStep.SCANNING_FOR_FONTS, "", 0, 0
-    ))
-    
-    # For some reason resvg doesn't scan the share directories from
-    # XDG_DATA_DIRS for fonts. Also scanning all of them takes a lot of time,
-    # so we do it once, instead of letting resvg do it for every image.
-    fonts_arguments = [
-        f"--use-font-file={path}"
-        for directory in os.environ["XDG_DATA_DIRS"].split(":")
-        for path in font.scan_fonts_dir(Path(directory))
-    ]
+        .add_icon_set(deepcopy(key_templates))
     
-    for i, key in enumerate(layout.keys):
-        position_u = keyboard_builder.resolve_key_position(key)
-        image_name = \
-            f"{position_u.x:.3g}".replace(".", "-") \
-            + "_" \
-            + f"{position_u.y:.3g}".replace(".", "-") \
-            + ".png"
+    # The PNGs produced by resvg are already deflate compressed, so compressing
+    # them again would only cost time. The archive is written directly to the
+    # output, instead of first being collected in memory.
+    with zipfile.ZipFile(out_file, "w", compression=zipfile.ZIP_STORED) as archive:
+        archive.mkdir("print")
+        archive.mkdir("outlined")
         
-        progress_handler(
-            ArchiveProgress(ArchiveStep.BUILDING_SVG, image_name, i, len(layout.keys))
-        )
+        progress_handler(ArchiveProgress(
+            ArchiveStep.SCANNING_FOR_FONTS, "", 0, 0
+        ))
         
-        builder = deepcopy(base_builder)
+        # For some reason resvg doesn't scan the share directories from
+        # XDG_DATA_DIRS for fonts. Also scanning all of them takes a lot of time,
+        # so we do it once (reusing the result of earlier runs when the directories
+        # haven't changed), instead of letting resvg do it for every image.
+        # Every resvg invocation loads all of the given font files, so the same
+        # file found through several directories (e.g. symlinked profiles) is only
+        # passed once.
+        font_paths = dict.fromkeys(
+            path.resolve()
+            for path in font.scan_fonts_dirs_cached(
+                Path(directory) for directory in os.environ["XDG_DATA_DIRS"].split(":")
+            )
+        )
+        fonts_arguments = [f"--use-font-file={path}" for path in font_paths]
         
+        # Shared between all keys, so that masks are only created once per size.
         factory = keyboard_builder.KeycapFactory(config).configure(
             keyboard_builder.KeycapRenderingOptions(
                 shading=False,
@@ -105,96 +177,104 @@ def package_keycap_icons_archive(
             ),
             key_templates
         )
-        info = keyboard_builder.KeycapInfo(key)
-        element = factory.create(info)
-        builder.set_viewbox(svg.ViewBox(
-            Vec2.promote(-config.icon_margin),
-            element.size + Scaling(config.icon_margin * 2)
-        ))
-        builder.add_element(make_element(
-                "defs",
-                {
-                    "id": "factory-elements",
-                },
-                factory.get_defs()
-            ))
-        builder.add_element(element.element)
-        
-        tree = builder.build()
-        normalize.palette_color_references(tree, config)
-        normalize.reduce_color_spaces_to_srgb(tree)
-        normalize.reduce_transform_origin(tree)
-        
-        progress_handler(
-            ArchiveProgress(ArchiveStep.RENDERING_PRINT, image_name, i, len(layout.keys))
-        )
         
-        image = subprocess.check_output(
-            [
-                "resvg",
-                f"--zoom={config.print_scale}",
-                # Note: resvg complains when using stdin without specifying
-                # `--resources-dir` for some reason...
-                "--resources-dir=/dev/null",
-                "-",
-                "-c",
-                *fonts_arguments,
-            ],
-            input=svg.tree_to_str(tree).encode(),
-        )
-        archive.writestr(f"print/print_{image_name}", image)
-        progress_handler(
-            ArchiveProgress(ArchiveStep.RENDERING_OUTLINE, image_name, i, len(layout.keys))
-        )
-        # Show icon outlines
-        for outline in svg.tree_find_by_class(tree, "outline"):
-            outline.set("visibility", "visible")
-        image = subprocess.check_output(
-            [
-                "resvg",
-                f"--zoom={config.print_outlined_scale}",
-                # Note: resvg complains when using stdin without specifying
-                # `--resources-dir` for some reason...
-                "--resources-dir=/dev/null",
-                "-",
-                "-c",
-                *fonts_arguments,
-            ],
-            input=svg.tree_to_str(tree).encode(),
-        )
-        archive.writestr(f"outlined/outlined_{image_name}", image)
-    
-    progress_handler(
-        ArchiveProgress(ArchiveStep.BUILDING_OVERVIEW, "overview.png", len(layout.keys) - 1, len(layout.keys))
-    )
-    
-    tree = keyboard_builder.KeyboardBuilder(config, key_templates)\
-        .configure_factory(keyboard_builder.KeycapRenderingOptions(
-            shading=False,
-            outline=keyboard_builder.OutlineOption.SHOW,
-            include_margin=True,
-        ))\
-        .embed_fonts(False)\
-        .keys(*layout.keys)\
-        .build()
-    normalize.palette_color_references(tree, config)
-    normalize.reduce_color_spaces_to_srgb(tree)
-    normalize.reduce_transform_origin(tree)
-    
-    image = subprocess.check_output(
-        [
-            "resvg",
-            f"--zoom={config.overview_scale}",
-            # Note: resvg complains when using stdin without specifying
-            # `--resources-dir` for some reason...
-            "--resources-dir=/dev/null",
-            "-",
-            "-c",
-            *fonts_arguments,
-        ],
-        input=svg.tree_to_str(tree).encode(),
-    )
-    archive.writestr(f"overview.png", image)
-    
-    archive.close()
-    return file
+        # resvg only uses a single thread, so the images are rendered in parallel
+        # while the next SVGs are being built. The archive is only written to from
+        # this thread, in the same order as the keys.
+        workers = os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Finished images are written as soon as all earlier ones have been
+            # written, and only a limited amount of keys are submitted ahead of
+            # that, so that the rendered images aren't all kept in memory at once.
+            renders: collections.deque[tuple[str, Future[bytes], Future[bytes]]] = collections.deque()
+            written = 0
+            def write_oldest_render() -> None:
+                nonlocal written
+                image_name, print_image, outlined_image = renders.popleft()
+                progress_handler(
+                    ArchiveProgress(ArchiveStep.RENDERING, image_name, written, len(layout.keys))
+                )
+                archive.writestr(f"print/print_{image_name}", print_image.result())
+                archive.writestr(f"outlined/outlined_{image_name}", outlined_image.result())
+                written += 1
+            
+            image_names = [
+                _format_position(position_u.x) + "_" + _format_position(position_u.y) + ".png"
+                for position_u in map(keyboard_builder.resolve_key_position, layout.keys)
+            ]
+            for i, (key, image_name) in enumerate(zip(layout.keys, image_names)):
+                progress_handler(
+                    ArchiveProgress(ArchiveStep.BUILDING_SVG, image_name, i, len(layout.keys))
+                )
+                
+                builder = base_builder.fork_shallow()
+                
+                info = keyboard_builder.KeycapInfo(key)
+                element, defs = factory.create_standalone(info)
+                builder.set_viewbox(svg.ViewBox(
+                    Vec2.promote(-config.icon_margin),
+                    element.size + Scaling(config.icon_margin * 2)
+                ))
+                builder.add_element(make_element(
+                        "defs",
+                        {
+                            "id": "factory-elements",
+                        },
+                        defs
+                    ))
+                builder.add_element(element.element)
+                
+                tree = builder.build()
+                normalize.palette_color_references(tree, config)
+                normalize.reduce_color_spaces_to_srgb(tree)
+                normalize.reduce_transform_origin(tree)
+                
+                # The print and outlined variants only differ in the visibility
+                # of the outlines, so the tree is only serialized once with a
+                # placeholder visibility, which is then replaced for each
+                # variant.
+                outlines = list(svg.tree_find_by_class(tree, "outline"))
+                for outline in outlines:
+                    outline.set("visibility", _outline_visibility_placeholder)
+                svg_content = svg.tree_to_str(tree).encode()
+                
+                if (count := svg_content.count(_outline_visibility_token)) != len(outlines):
+                    panic(f"Expected {len(outlines)} outline visibility placeholders in the document of key '{image_name}', found {count}")
+                print_svg = svg_content.replace(_outline_visibility_token, b'visibility="hidden"')
+                outlined_svg = svg_content.replace(_outline_visibility_token, b'visibility="visible"')
+                
+                print_image = executor.submit(
+                    _render_png, print_svg, config.print_scale, fonts_arguments
+                )
+                outlined_image = executor.submit(
+                    _render_png, outlined_svg, config.print_outlined_scale, fonts_arguments
+                )
+                renders.append((image_name, print_image, outlined_image))
+                if len(renders) > workers * 2:
+                    write_oldest_render()
+            
+            progress_handler(
+                ArchiveProgress(ArchiveStep.BUILDING_OVERVIEW, "overview.png", len(layout.keys) - 1, len(layout.keys))
+            )
+            
+            tree = keyboard_builder.KeyboardBuilder(config, key_templates)\
+                .configure_factory(keyboard_builder.KeycapRenderingOptions(
+                    shading=False,
+                    outline=keyboard_builder.OutlineOption.SHOW,
+                    include_margin=True,
+                ))\
+                .embed_fonts(False)\
+                .keys(*layout.keys)\
+                .build()
+            normalize.palette_color_references(tree, config)
+            normalize.reduce_color_spaces_to_srgb(tree)
+            normalize.reduce_transform_origin(tree)
+            
+            overview_image = executor.submit(
+                _render_png, tree, config.overview_scale, fonts_arguments
+            )
+            
+            while renders:
+                write_oldest_render()
+            
+            archive.writestr(f"overview.png", overview_image.result())
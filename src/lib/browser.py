@@ -30,10 +30,10 @@ def create_page() -> Iterator[playwright.Page]:
             browser.close()
 
 
-def render_single_segment(page: playwright.Page, rect: Bounds, path: Path) -> None:
+def render_single_segment(page: playwright.Page, rect: Bounds) -> bytes:
+    """Render the given area of the page, returning the PNG contents."""
     pos, size = rect.to_pos_size()
-    page.screenshot(
-        path=path,
+    return page.screenshot(
         clip={"x": pos.x, "y": pos.y, "width": size.x, "height": size.y},
         omit_background=True,
     )
@@ -46,23 +46,18 @@ def render_segmented(page: playwright.Page, segment_max_width: Vec2[int], path:
         page.viewport_size["height"]
     )
     total_bounds = Bounds.from_pos_size(Vec2(0, 0), total_size)
-    temp_dir = tempfile.TemporaryDirectory()
-    directory = Path(temp_dir.name)
-    indices = list[Vec2[int]]()
+    # The tiles are kept in memory, instead of being written to and read back
+    # from temporary files. `as_segments` yields the segments in row-major
+    # order, so the first n tiles constitute the first row, the second
+    # constitute the second row and so on.
+    tiles = list[bytes]()
+    max_index = Vec2[int](0, 0)
     pairs = tuple(total_bounds.as_segments(segment_max_width.cast_to(int)))
     for index, (index_pair, segment) in enumerate(pairs):
         if progress_handler is not None:
             progress_handler(render.TileRenderProgress(index, len(pairs)))
-        render_single_segment(page, segment, directory / f"{index_pair.x}_{index_pair.y}.png")
-        indices.append(index_pair)
+        tiles.append(render_single_segment(page, segment))
+        max_index = Vec2(max(max_index.x, index_pair.x), max(max_index.y, index_pair.y))
     
-    # Sorted, so that the first n items constitutes the first row, the second
-    # constitutes the second row and so on.
-    indices_sorted = sorted(indices, key=lambda pair: tuple(pair[::-1]))
-    paths = map(
-        lambda pair: directory / f"{pair.x}_{pair.y}.png", 
-        indices_sorted
-    )
-    
-    count = Vec2[int].max(*indices) + Vec2(1, 1)
-    return render.ImageTileMap(temp_dir, paths, count, path)
+    count = max_index + Vec2(1, 1)
+    return render.ImageTileMap(None, tiles, count, path)
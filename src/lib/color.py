@@ -19,6 +19,11 @@ __all__ = [
     "HideableColor",
 ]
 
+_css_declaration_separator = re.compile(r"\s*:\s*")
+_css_double_quoted = re.compile(r"^\".*[^\\]\"$|^\"\"$")
+_css_single_quoted = re.compile(r"^'.*[^\\]'$|^''$")
+_css_escape_sequence = re.compile(r"\\(.)")
+
 # TODO: move out CSS stuff
 class CssStyles(dict[str, str]):
     @classmethod
@@ -27,7 +32,7 @@ class CssStyles(dict[str, str]):
         if len(statements) == 1 and statements[0] == "":
             return cls()
         return cls(
-            re.split(r"\s*:\s*", statement, 1)
+            _css_declaration_separator.split(statement, 1)
             for statement in statements
         )
     
@@ -68,14 +73,16 @@ def css_parse_url(value: str) -> str|None:
         .removesuffix(")")\
         .strip()
     
-    if re.match(r"^\".*[^\\]\"$|^\"\"$", value):
+    if _css_double_quoted.match(value):
         value = value.removeprefix("\"").removesuffix("\"")
-    if re.match(r"^'.*[^\\]'$|^''$", value):
+    if _css_single_quoted.match(value):
         value = value.removeprefix("'").removesuffix("'")
     
-    return re.sub(r"\\(.)", r"\1", value)
+    return _css_escape_sequence.sub(r"\1", value)
 
 class HideableColor(Color):
+    __slots__ = ("hidden",)
+    
     hidden: bool
     
     @overload
@@ -113,9 +120,8 @@ class HideableColor(Color):
         
         Color.__init__(self, color, data, alpha, **kwargs)
         
-        if isinstance(color, HideableColor):
-            self.hidden = color.hidden
-        self.hidden = hidden
+        # Copies of hidden colors stay hidden.
+        self.hidden = hidden or (isinstance(color, HideableColor) and color.hidden)
     
     def to_css_value(self) -> str:
         return (
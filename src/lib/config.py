@@ -3,7 +3,9 @@ from typing import *
 from dataclasses import dataclass, asdict
 import dataclasses
 import os
+import json
 import json5
+import functools
 import jsonschema
 import pathlib
 
@@ -42,7 +44,11 @@ class ThemeDeclaration(TypedDict):
     top_size: float
     colors: PaletteDeclaration
 
+# Palettes, and the colors in them, are not modified after being constructed,
+# which is what lets the css colors be computed once up front.
 class Palette(dict[str, HideableColor]):
+    # Result of `css_colors`, computed when constructed.
+    _css_colors: dict[str, str]
     
     def __init__(self, declaration: PaletteDeclaration):
         def resolve_color(declaration: ColorDeclaration) -> HideableColor:
@@ -61,6 +67,8 @@ class Palette(dict[str, HideableColor]):
         
         for name, color_declaration in declaration.items():
             self[name] = resolve_plastic_color(color_declaration)
+        
+        self._css_colors = dict((name, value.to_css_value()) for name, value in self.items())
     
     # Return list of keycap colors in self, i.e. those that start with "bg_"
     def keycap_colors(self) -> Iterable[tuple[str, HideableColor]]:
@@ -68,11 +76,19 @@ class Palette(dict[str, HideableColor]):
     
     # Create map of own fields to valid CSS color strings.
     def css_colors(self) -> dict[str, str]:
-        return dict((name, value.to_css_value()) for name, value in self.items())
+        return dict(self._css_colors)
     
     def as_css_styles(self) -> CssStyles:
         return CssStyles((f"--{name}", color) for name, color in self.css_colors().items())
 
+@functools.cache
+def _theme_schema_validator() -> Any:
+    # The schema is plain JSON, which the standard library parses much faster
+    # than json5.
+    with open(project.path_to_absolute("assets/schemas/theme-schema.json")) as file:
+        schema = json.load(file)
+    return jsonschema.validators.validator_for(schema)(schema)
+
 @dataclass
 class Theme():
     default_font: FontDefinition
@@ -116,8 +132,7 @@ class Theme():
         # type JsonValueSimple = str | int | None
         # type JsonValue = JsonValueSimple | dict[str, JsonValue] | list[JsonValue]
         
-        with open(project.path_to_absolute("assets/schemas/theme-schema.json")) as file:
-            schema = json5.load(file)
+        validator = _theme_schema_validator()
         
         path = pathlib.Path(theme_path)
         if not path.exists():
@@ -130,7 +145,7 @@ class Theme():
             theme_object = json5.load(file)
         
         try:
-            jsonschema.validate(theme_object, schema)
+            validator.validate(theme_object)
         except jsonschema.ValidationError as error:
             panic(f"The specified theme '{theme_path}' json is invalid:\n    {error}")
         # This type cast is technically not completely sound, as the json object may
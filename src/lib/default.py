@@ -1,4 +1,5 @@
 from typing import *
+from dataclasses import dataclass
 
 __all__ = [
     "NotSpecified",
@@ -7,26 +8,29 @@ __all__ = [
 
 
 @final
-class NotSpecified:
-    """
-    Sentinel value meant to be assigned as default values for function
-    arguments.
+@dataclass(frozen=True, slots=True)
+class NotSpecifiedType:
+    """Type of `NotSpecified`"""
     
-    Example
-    ```
-    def my_function[T](argument: T|NotSpecifiedType = NotSpecified):
-        if argument is NotSpecified:
-            argument = 42
-        print(argument)
-    
-        
-    my_function(10)
-    # > 10
-    my_function()
-    # > 42
-    ```
-    """
-    pass
+    def __repr__(self) -> str:
+        return "NotSpecified"
+
+NotSpecified: Final = NotSpecifiedType()
+"""
+Sentinel value meant to be assigned as default values for function
+arguments.
 
-type NotSpecifiedType = type[NotSpecified]
-"""Type of `NotSpecified`"""
+Example
+```
+def my_function[T](argument: T|NotSpecifiedType = NotSpecified):
+    if argument is NotSpecified:
+        argument = 42
+    print(argument)
+
+    
+my_function(10)
+# > 10
+my_function()
+# > 42
+```
+"""
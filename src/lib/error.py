@@ -49,44 +49,37 @@ def map_some[T, R](value: Option[T], f: Callable[[T], R]) -> Option[R]:
         case some_value:
             return f(some_value)
 
+# These helpers are called a lot, so they check the exact type directly rather
+# than going through the slower class pattern matching.
+
 def map_ok[T, U, R](value: Result[T, U], f: Callable[[T], R]) -> Result[R, U]:
-    match value:
-        case Error(err_value):
-            return Error(err_value)
-        case Ok(ok_value):
-            return Ok(f(ok_value))
+    if type(value) is Ok:
+        return Ok(f(value.value))
+    # Error is immutable, so it can be returned as is.
+    return cast(Error[U], value)
 
 def unwrap[T](value: Result[T, Any]|Option[T]) -> T:
-    match value:
-        case Error(error):
-            panic(f"Tried to unwrap error({error})", 1)
-        case None:
-            panic(f"Tried to unwrap None", 1)
-        case Ok(ok):
-            return ok
-        case some:
-            return some
+    value_type = type(value)
+    if value_type is Ok:
+        return cast(Ok[T], value).value
+    if value_type is Error:
+        panic(f"Tried to unwrap error({cast(Error[Any], value).value})", 1)
+    if value is None:
+        panic(f"Tried to unwrap None", 1)
+    return cast(T, value)
 
 def unwrap_or[T, U](value: Result[T, Any]|Option[T], default: U) -> T | U:
-    match value:
-        case Error(error):
-            return default
-        case None:
-            return default
-        case Ok(ok):
-            return ok
-        case some:
-            return some
+    value_type = type(value)
+    if value_type is Ok:
+        return cast(Ok[T], value).value
+    if value_type is Error or value is None:
+        return default
+    return cast(T, value)
 
 def collect_results[T, U](iterable: Iterable[Result[T, U]]) -> Result[list[T], U]:
     result = list[T]()
-    iterator = iter(iterable)
-    try:
-        while True:
-            match next(iterator):
-                case Ok(value):
-                    result.append(value)
-                case Error(value):
-                    return Error(value)
-    except StopIteration:
-        return Ok(result)
+    for value in iterable:
+        if type(value) is Error:
+            return value
+        result.append(cast(Ok[T], value).value)
+    return Ok(result)
@@ -4,10 +4,12 @@ from typing import *
 from pathlib import Path
 import os
 import base64
+import mmap
+import json
 from fontTools import ttLib
 from fontTools.pens.boundsPen import BoundsPen
-from decimal import Decimal
 import functools
+from concurrent.futures import ThreadPoolExecutor
 
 from .utils import *
 from .error import *
@@ -21,6 +23,7 @@ __all__ = [
     "FontDefinition",
     "get_system_family",
     "generate_css_rule",
+    "generate_css_rules",
 ]
 
 # fc weight to css weight
@@ -43,12 +46,24 @@ from fontTools.ttLib.tables._h_e_a_d import table__h_e_a_d
 from fontTools.ttLib.tables._h_h_e_a import table__h_h_e_a
 from fontTools.ttLib.tables._g_l_y_f import table__g_l_y_f
 from fontTools.ttLib.ttGlyphSet import _TTGlyphSetVARC, _TTGlyphSetCFF, _TTGlyphSetGlyf
+# The modification time is part of the key so that edited fonts are reloaded.
+@functools.lru_cache(maxsize=64)
+def _load_tt_font(path: Path, modification_time: int) -> ttLib.TTFont:
+    # Only the few tables (and glyphs) needed for the metrics are ever used, so
+    # only decompile them once they're accessed.
+    return ttLib.TTFont(path, lazy=True)
+
 class TTFontWrapper:
 
     tt: ttLib.TTFont
+    _extents_cache: dict[str, tuple[int, int]]
     
     def __init__(self, path: Path) -> None:
-        self.tt = ttLib.TTFont(path)
+        # The same font files are often loaded several times, so only parse each
+        # one once.
+        path = path.resolve()
+        self.tt = _load_tt_font(path, path.stat().st_mtime_ns)
+        self._extents_cache = {}
     
         
     # Get Horizontal Header Table
@@ -68,16 +83,32 @@ class TTFontWrapper:
         
     def getGlyphSet(self) -> _TTGlyphSetVARC | _TTGlyphSetCFF | _TTGlyphSetGlyf:
         return self.tt.getGlyphSet()
+    
+    # Get the (y_min, y_max) extents of the glyph with the given name in font
+    # units. Drawing the outline is expensive, so it's only done once per glyph.
+    def glyph_extents(self, glyph_name: str) -> tuple[int, int]:
+        if (extents := self._extents_cache.get(glyph_name)) is not None:
+            return extents
+        
+        glyphs = self.getGlyphSet()
+        bounds_pen = BoundsPen(glyphs)
+        glyphs[glyph_name].draw(bounds_pen)
+        extents = (
+            assert_instance(int, bounds_pen.bounds[1]),
+            assert_instance(int, bounds_pen.bounds[3]),
+        )
+        self._extents_cache[glyph_name] = extents
+        return extents
 
-@dataclass
+@dataclass(slots=True)
 class Extenders:
-    descenders: Decimal
-    ascenders: Decimal
+    descenders: float
+    ascenders: float
     
     # For a glyph with these ascenders and descenders, get the offset of its bounding box's
     # center point from the baseline in the unit em. The bounding box is formed
     # tightly around the extenders.
-    def center_offset(self) -> Decimal:
+    def center_offset(self) -> float:
         return (self.ascenders + self.descenders) / 2
 
 class FontMetrics:
@@ -86,71 +117,92 @@ class FontMetrics:
     def __init__(self, font_file: Path) -> None:
         self.tables = TTFontWrapper(font_file)
     
-    @functools.cache
+    # Get metrics for the font file which are shared with every other user of
+    # the same file, so that the computed metrics are only calculated once.
+    @staticmethod
+    def for_path(font_file: Path) -> FontMetrics:
+        path = font_file.resolve()
+        return _font_metrics_for(path, path.stat().st_mtime_ns)
+    
+    @functools.cached_property
     def units_per_em(self) -> int:
         head = self.tables.head()
         return assert_instance(int, head.unitsPerEm) # type: ignore
     
+    # Multiplying by this is cheaper than dividing by units_per_em.
+    @functools.cached_property
+    def em_per_unit(self) -> float:
+        return 1.0 / self.units_per_em
+    
     # Get the extends of this font in em, i.e. the distance from the baseline to
     # the highest ascender and lowest descender.
-    @functools.cache
+    @functools.cached_property
     def extenders(self) -> Extenders:
         hhea = self.tables.hhea()
         
         return Extenders(
-            Decimal(hhea.ascent) / self.units_per_em(),
-            Decimal(hhea.descent) / self.units_per_em(),
+            hhea.ascent * self.em_per_unit,
+            hhea.descent * self.em_per_unit,
         )
     
     # Get the ascenders and descenders of the letter with the given glyph name
     # in em.
-    @functools.cache
     def glyph_extenders(self, glyph_name: str) -> Extenders:
-        glyphs = self.tables.getGlyphSet()
-        bounds_pen = BoundsPen(glyphs)
-        glyphs[glyph_name].draw(bounds_pen)
-        y_min_units = assert_instance(int, bounds_pen.bounds[1])
-        y_max_units = assert_instance(int, bounds_pen.bounds[3])
+        y_min_units, y_max_units = self.tables.glyph_extents(glyph_name)
         return Extenders(
-            Decimal(y_min_units) / self.units_per_em(),
-            Decimal(y_max_units) / self.units_per_em(),
+            y_min_units * self.em_per_unit,
+            y_max_units * self.em_per_unit,
         )
     
     # Get the height of the letter with the name glyph_name in the unit em.
-    @functools.cache
-    def glyph_height(self, glyph_name: str) -> Decimal:
+    def glyph_height(self, glyph_name: str) -> float:
         extenders = self.glyph_extenders(glyph_name)
         return extenders.ascenders - extenders.descenders
     
     # The height of the letter H in em.
-    @functools.cache
-    def cap_height(self) -> Decimal:
+    @functools.cached_property
+    def cap_height(self) -> float:
         return self.glyph_height("H")
     
     # The height of the letter x in em.
-    @functools.cache
-    def x_height(self) -> Decimal:
+    @functools.cached_property
+    def x_height(self) -> float:
         return self.glyph_height("x")
     
     # Get the offset of the center point of the bounding box defined by the fonts ascent
     # and descent metrics in the unit em.
-    @functools.cache
-    def center_offset(self) -> Decimal:
-        return self.extenders().center_offset()
+    @functools.cached_property
+    def center_offset(self) -> float:
+        return self.extenders.center_offset()
     
     # Get the offset of the center point of the bounding box of 'H' from the baseline in
     # the unit em.
-    @functools.cache
-    def cap_center_offset(self) -> Decimal:
+    @functools.cached_property
+    def cap_center_offset(self) -> float:
         return self.glyph_extenders("H").center_offset()
     
     # Get the offset of the center point of the bounding box of 'x' from the baseline in
     # the unit em.
-    @functools.cache
-    def x_center_offset(self) -> Decimal:
+    @functools.cached_property
+    def x_center_offset(self) -> float:
         return self.glyph_extenders("x").center_offset()
 
-@dataclass
+# The modification time is part of the key so that edited fonts are reloaded.
+@functools.lru_cache(maxsize=64)
+def _font_metrics_for(path: Path, modification_time: int) -> FontMetrics:
+    return FontMetrics(path)
+
+# Get the (family, weight) fontconfig properties of a font file.
+@functools.lru_cache(maxsize=64)
+def _query_font_properties(path: Path, modification_time: int) -> tuple[str, str]:
+    # Query both properties at once to only spawn a single process. fc-query
+    # prints one line per face (and per named instance of variable fonts), of
+    # which only the first is used.
+    output = shell.run_command_infalliable("fc-query", str(path), "-f", "%{family}\t%{weight}\n")
+    family, fc_weight = output.splitlines()[0].split("\t")
+    return (family, fc_weight)
+
+@dataclass(slots=True)
 class FontDefinition:
     family: str
     weight: str
@@ -159,59 +211,189 @@ class FontDefinition:
     
     def __init__(self, file: str | Path) -> None:
         path = file if isinstance(file, Path) else Path(file)
-        known_font_extensions = [".otf", ".ttf", ".woff", ".woff2"]
+        _check_font_extension(path)
         
-        if path.suffix not in known_font_extensions:
-            panic(f"Invalid file extension in font file '{path}'. Valid extensions are {known_font_extensions}")
+        if not path.is_file():
+            panic(f"Font file '{path}' does not exist")
         
-        self.family = shell.run_command_infalliable("fc-query", str(path), "-f", "%{family}")
-        fc_weight = shell.run_command_infalliable("fc-query", str(path), "-f", "%{weight}")
-        if fc_weight in _fc_weight_mapping:
-            self.weight = _fc_weight_mapping[fc_weight]
-        else:
-            self.weight = fc_weight
+        resolved_path = path.resolve()
+        family, fc_weight = _query_font_properties(resolved_path, resolved_path.stat().st_mtime_ns)
+        self._init_from_parts(path, family, fc_weight)
+    
+    # Create a definition from already known fontconfig properties, without
+    # querying them again.
+    @classmethod
+    def _from_parts(cls, path: Path, family: str, fc_weight: str) -> Self:
+        _check_font_extension(path)
+        
+        definition = cls.__new__(cls)
+        definition._init_from_parts(path, family, fc_weight)
+        return definition
+    
+    def _init_from_parts(self, path: Path, family: str, fc_weight: str) -> None:
+        self.family = family
+        self.weight = _fc_weight_mapping.get(fc_weight, fc_weight)
         
         self.path = path
-        self.metrics = FontMetrics(path)
+        self.metrics = FontMetrics.for_path(path)
+
+def _check_font_extension(path: Path) -> None:
+    known_font_extensions = [".otf", ".ttf", ".woff", ".woff2"]
+    
+    if path.suffix not in known_font_extensions:
+        panic(f"Invalid file extension in font file '{path}'. Valid extensions are {known_font_extensions}")
 
 def get_system_family(family: str) -> Result[list[FontDefinition], None]:
-    match shell.run_command("fc-list", "-q", f":family={family}"):
-        case (127, _):
-            panic("fc-list is not installed!")
-        case (code, _):
-            is_installed = (code == 0)
+    # List the properties of every matching font in one go instead of querying
+    # each file separately. Nothing is listed if the family isn't installed.
+    output = shell.run_command_infalliable("fc-list", f":family={family}", "-f", "%{file}\t%{family}\t%{weight}\n")
     
-    if not is_installed:
+    lines = [line for line in output.splitlines() if line != ""]
+    if len(lines) == 0:
         return Error(None)
     
-    file_paths = shell.run_command_infalliable("fc-list", f":family={family}", "-f", "%{file}\n").removesuffix("\n").split("\n")
+    definitions = list[FontDefinition]()
+    for line in lines:
+        path, font_family, fc_weight = line.split("\t")
+        definitions.append(FontDefinition._from_parts(Path(path), font_family, fc_weight))
+    
+    return Ok(definitions)
+
+def _encode_font_file(path: Path) -> str:
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return ""
+        # Encode straight from the mapped file to avoid an extra copy of it.
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            return base64.b64encode(content).decode("ascii")
+
+# The rules embed the entire font file, so they're expensive to build and are
+# only built once per font. The modification time is part of the key so that
+# edited fonts are re-encoded. The returned statements are shared and must not
+# be mutated.
+@functools.lru_cache(maxsize=16)
+def _build_css_rule(path: Path, modification_time: int, family: str, weight: str) -> CssStatement:
+    mime_type = f"font/{path.suffix.removeprefix(".")}"
     
-    return Ok([FontDefinition(path) for path in file_paths])
+    return CssStatement("".join((
+        "@font-face {\n",
+        f"  font-family: \"{family}\";\n",
+        f"  font-weight: {weight};\n",
+        f"  src: url(data:{mime_type};base64,",
+        _encode_font_file(path),
+        ")\n",
+        "}",
+    )))
 
 def generate_css_rule(font: FontDefinition) -> CssStatement:
-    mime_type = f"font/{font.path.suffix.removeprefix(".")}"
-    encoded = base64.b64encode(font.path.read_bytes()).decode()
-    
-    return CssStatement(
-        "@font-face {\n"
-        f"  font-family: \"{font.family}\";\n"
-        f"  font-weight: {font.weight};\n"
-        f"  src: url(data:{mime_type};base64,{encoded})\n"
-        "}"
-    )
-
-def scan_fonts_dir(dir: Path) -> Iterable[Path]:
+    path = font.path.resolve()
+    return _build_css_rule(path, path.stat().st_mtime_ns, font.family, font.weight)
+
+def generate_css_rules(fonts: Iterable[FontDefinition]) -> list[CssStatement]:
+    """
+    Generate the CSS rules of several fonts, like `generate_css_rule`, reading
+    and encoding the font files in parallel.
+    """
+    
+    fonts = list(fonts)
+    if len(fonts) <= 1:
+        return list(map(generate_css_rule, fonts))
+    
+    with ThreadPoolExecutor(max_workers=min(len(fonts), 8)) as executor:
+        return list(executor.map(generate_css_rule, fonts))
+
+def scan_fonts_dir(dir: Path, walked_dirs: list[str] | None = None) -> Iterable[Path]:
     """Find list of font files in directory and its subdirectories.
     
     Returns the exact same font files that resvg would when --use-fonts-dir is
-    used.
+    used. If `walked_dirs` is given, every directory that was read is appended
+    to it.
+    """
+    
+    # Unreadable directories are skipped, like os.walk does.
+    try:
+        entries = os.scandir(dir)
+    except OSError:
+        return
+    
+    if walked_dirs is not None:
+        walked_dirs.append(str(dir))
+    
+    subdirectories = list[str]()
+    with entries:
+        for entry in entries:
+            # The entry type usually comes from the directory listing itself,
+            # so this doesn't need a stat call per file.
+            if entry.is_dir():
+                # Like os.walk, don't follow symlinked directories.
+                if not entry.is_symlink():
+                    subdirectories.append(entry.path)
+            elif entry.name.lower().endswith(_font_file_extensions):
+                yield Path(entry.path)
+    
+    # Files come before those in subdirectories, in the same order as os.walk.
+    for subdirectory in subdirectories:
+        yield from scan_fonts_dir(Path(subdirectory), walked_dirs)
+
+_font_file_extensions = (".ttf", ".ttc", ".otf", ".otc")
+
+# Bump when the format of the font scan cache changes.
+_font_scan_cache_version = 2
+
+def _get_modification_times(paths: Iterable[str]) -> dict[str, int | None]:
+    def modification_time(path: str) -> int | None:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+    return {path: modification_time(path) for path in paths}
+
+def scan_fonts_dirs_cached(dirs: Iterable[Path]) -> list[Path]:
+    """Find font files like `scan_fonts_dir` in each of the directories.
+    
+    The result for each directory is cached on disk, and reused as long as the
+    modification times of the directory and all of its subdirectories haven't
+    changed. Adding or removing a file or directory anywhere in the tree
+    changes the modification time of its parent, so this catches new fonts as
+    well as new font directories.
     """
     
-    for root, _, filenames in os.walk(dir):
-        for filename in filenames:
-            path = Path(root) / filename
-            match path.suffix.lower():
-                case ".ttf" | ".ttc" | ".otf" | ".otc":
-                    yield path
-                case _:
-                    continue
+    cache_path = cache_directory() / "fonts.json"
+    try:
+        with open(cache_path, "r") as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        cache = {}
+    if not isinstance(cache, dict) or cache.get("version") != _font_scan_cache_version:
+        cache = {}
+    entries: dict[str, Any] = cache.get("directories", {})
+    
+    result: list[Path] = []
+    updated = False
+    for dir in dirs:
+        entry = entries.get(str(dir))
+        if entry is not None and _get_modification_times(entry["modification_times"]) == entry["modification_times"]:
+            paths = [Path(path) for path in entry["fonts"]]
+        else:
+            # The directory itself is always watched, so that it being created
+            # or becoming readable is noticed as well.
+            walked_dirs = [str(dir)]
+            paths = list(scan_fonts_dir(dir, walked_dirs))
+            entries[str(dir)] = {
+                "modification_times": _get_modification_times(walked_dirs),
+                "fonts": [str(path) for path in paths],
+            }
+            updated = True
+        result.extend(paths)
+    
+    if updated:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temporary_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(temporary_path, "w") as file:
+                json.dump({"version": _font_scan_cache_version, "directories": entries}, file)
+            temporary_path.replace(cache_path)
+        except OSError:
+            pass
+    
+    return result
@@ -1,7 +1,9 @@
 from __future__ import annotations
 from typing import *
 from dataclasses import dataclass
+import functools
 import os
+import json
 import json5
 import jsonschema
 import pathlib
@@ -19,7 +21,24 @@ __all__ = [
     "GenerationMetadata",
 ]
 
-@dataclass
+# Most files are plain JSON, which the standard library parses much faster than
+# json5, so only fall back to json5 when that fails.
+def _load_json(file: IO[str]) -> Any:
+    try:
+        return json.load(file)
+    except json.JSONDecodeError:
+        file.seek(0)
+        return json5.load(file)
+
+# Load the schema and build its validator only once, since doing so is
+# expensive and they never change.
+@functools.cache
+def _load_schema() -> Any:
+    with open(project.path_to_absolute("assets/schemas/generation-metadata-schema.json")) as file:
+        schema = json5.load(file)
+    return jsonschema.validators.validator_for(schema)(schema)
+
+@dataclass(slots=True)
 class GenerationMetadata():
     layout_path: pathlib.Path
     theme_path: pathlib.Path
@@ -31,8 +50,7 @@ class GenerationMetadata():
         # type JsonValueSimple = str | int | None
         # type JsonValue = JsonValueSimple | dict[str, JsonValue] | list[JsonValue]
         
-        with open(project.path_to_absolute("assets/schemas/generation-metadata-schema.json")) as file:
-            schema = json5.load(file)
+        validator = _load_schema()
         
         path = pathlib.Path(path)
         if not path.exists():
@@ -42,10 +60,10 @@ class GenerationMetadata():
             panic(f"'{path}' is not a file")
         
         with open(path) as file:
-            metadata = json5.load(file)
+            metadata = _load_json(file)
         
         try:
-            jsonschema.validate(metadata, schema)
+            validator.validate(metadata)
         except jsonschema.ValidationError as error:
             panic(f"The specified generation metadata '{path}' json is invalid:\n    {error}")
         
@@ -64,7 +82,7 @@ class GenerationMetadata():
     def load_layout(self) -> kle.ExtendedKeyboard:
         with open(self.layout_path, "r") as file:
             return kle.ExtendedKeyboard.from_json(
-                json5.load(file)
+                _load_json(file)
             )
     
     def load(self) -> tuple[kle.ExtendedKeyboard, Config]:
@@ -73,7 +91,7 @@ class GenerationMetadata():
             layout,
             Config.from_parts(
                 theme=Theme.load_file(self.theme_path),
-                layout=self.load_layout(),
+                layout=layout,
                 args=self.args,
             )
         )
@@ -91,4 +109,4 @@ class GenerationMetadata():
                 },
             }
             
-            json5.dump(result, file)
+            json.dump(result, file)
@@ -1,6 +1,5 @@
 from typing import *
 import itertools
-import more_itertools
 
 __all__ = [
     "chunks",
@@ -34,8 +33,12 @@ def chunks[T](iterator: Iterable[T], chunk_size: int) -> Iterable[tuple[T, ...]]
     `chunk_size`.
     """
     
-    while True:
-        chunk = tuple(more_itertools.take(chunk_size, iterator))
+    if chunk_size == 0:
+        # itertools.batched doesn't accept empty chunks.
+        yield from itertools.repeat(())
+        return
+    
+    for chunk in itertools.batched(iterator, chunk_size):
         if len(chunk) != chunk_size:
             return
         
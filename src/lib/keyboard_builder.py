@@ -6,7 +6,9 @@ import functools
 import damsenviet.kle as kle
 import itertools
 import re
-from copy import deepcopy
+from copy import copy, deepcopy
+from collections import defaultdict
+from pathlib import Path
 
 from . import project, magic
 from .config import *
@@ -31,8 +33,53 @@ __all__ = [
     "pack_keys_for_print",
 ]
 
-def resolve_key_position(key: kle.Key) -> Vec2[float]:
-    return rotate(Vec2(key.x, key.y), Vec2(key.rotation_x, key.rotation_y), key.rotation_angle)
+# See KeycapInfo.__init__ for the grammar.
+_color_mapping = r"(?:(?!->)[^;])+->(?:(?!->)[^;])+"
+_color_mappings_pattern = re.compile(rf"{_color_mapping}(?:;{_color_mapping})*")
+_icon_reference_pattern = re.compile(r"\[(.*)\]")
+
+# Get the position of the key after its rotation, multiplied by `scale`.
+def resolve_key_position(key: kle.Key, scale: float = 1) -> Vec2[float]:
+    # Most keys aren't rotated, so skip the trigonometry for them.
+    if key.rotation_angle == 0:
+        return Vec2(key.x * scale, key.y * scale)
+    # Rotations are linear, so scaling before rotating is the same as after.
+    return rotate(
+        Vec2(key.x * scale, key.y * scale),
+        Vec2(key.rotation_x * scale, key.rotation_y * scale),
+        key.rotation_angle,
+    )
+
+@dataclass(frozen=True)
+class _IconTemplate:
+    tree: svg.ElementTree
+    # The child svg element with id "icon", if there is one.
+    element: ET.Element | None
+
+# Parse and normalize an icon file. The same icons are used by many keys, so
+# each file is only parsed once. The result must not be mutated, copy it first.
+# The modification time is part of the key so that edited icons are reloaded.
+@functools.lru_cache(maxsize=None)
+def _load_icon_template(path: Path, modification_time: int) -> _IconTemplate:
+    # Let the parser read the raw bytes itself rather than decoding them to text
+    # first, which it would just encode again.
+    tree = ET.parse(path)
+    
+    for element in tree.iter():
+        element_resolve_namespaces(element)
+    
+    # This is required if the file has been edited with Inkscape.
+    untangle_gradient_links(tree)
+    
+    # Scan directly instead of evaluating a path expression. The namespaces have
+    # already been resolved, so the tag is just "svg".
+    root = tree.getroot()
+    icon_element = next(
+        (element for element in root.iter("svg") if element is not root and element.get("id") == "icon"),
+        None
+    )
+    
+    return _IconTemplate(tree, icon_element)
 
 # Get svg of the specified id or None if it does not exist.
 def lookup_icon_id(id: str, defs: DefsSet) -> SvgElement | None:
@@ -40,61 +87,71 @@ def lookup_icon_id(id: str, defs: DefsSet) -> SvgElement | None:
     if not path.is_file():
         return None
     
-    with path.open() as file:
-        svg = ET.parse(file)
-    
-    for element in svg.iter():
-        element_resolve_namespaces(element)
-    
-    # This is required if the file has been edited with Inkscape.
-    untangle_gradient_links(svg)
-    
-    element = svg.getroot().find(".//svg[@id='icon']")
-    if element == None:
+    template = _load_icon_template(path, path.stat().st_mtime_ns)
+    if template.element is None:
         panic(f"icon {id}'s SVG file did not contain child svg element with id 'icon'")
     
+    # Only the icon itself is modified, the referenced elements are copied out of
+    # the shared tree as they're extracted.
+    element = deepcopy(template.element)
     element.attrib["id"] = f"icon_{id}"
     
-    defs.extract_references_from_element_in_tree(element, svg)
+    defs.extract_references_from_element_in_tree(element, template.tree)
     
     return SvgElement(element)
 
+# The same few fonts, sizes and colors are used for most keys, so the style of
+# their text elements only needs to be formatted once.
+@functools.lru_cache(maxsize=64)
+def _text_icon_style(font_weight: str, font_size_px: float, font_family: str, foreground_color: str) -> str:
+    return (
+        f"font-weight:{font_weight};"
+        f"font-size:{font_size_px}px;"
+        f"font-family:{font_family};"
+        f"fill:url(#{foreground_color});"
+        f"white-space:normal;"
+        f"white-space-collapse:collapse;"
+        f"text-wrap:nowrap;"
+    )
+
+# Get the attributes of the root svg element of a text icon with the given size.
+# The id is left empty, to be set once the attributes have been copied into an
+# element, so that it still comes first. The returned dict is shared and must
+# not be mutated.
+@functools.lru_cache(maxsize=64)
+def _text_icon_root_attributes(width: float, height: float) -> dict[str, str]:
+    width_str = number_to_str(width)
+    height_str = number_to_str(height)
+    return {
+        "id": "",
+        "viewBox": f"0 0 {width_str} {height_str}",
+        "width": width_str,
+        "height": height_str,
+        "style": "overflow:visible;",
+    }
+
 # id defaults to text
 def create_text_icon_svg(text: str, id: str|None, keycap_size: Vec2, font: Font.FontDefinition, font_size_px: float, foreground_color: str|None) -> SvgElement:
     id = id if id != None else text
     id = f"icon_{id}" if id != "" else "icon"
     
-    text_span_element = ET.Element("tspan")
-    text_span_element.text = text
-    
     size = keycap_size * 100
     
-    centered_y = size.y / 2 + (font_size_px * float(font.metrics.cap_center_offset()))
-    
-    text_element = ET.Element("text", {
-        "style":
-            f"font-weight:{font.weight};"
-            f"font-size:{font_size_px}px;"
-            f"font-family:{font.family};"
-            f"fill:url(#{foreground_color or "fg_main"});"
-            f"white-space:normal;"
-            f"white-space-collapse:collapse;"
-            f"text-wrap:nowrap;",
+    centered_y = size.y / 2 + (font_size_px * font.metrics.cap_center_offset)
+    
+    root = ET.Element("svg", _text_icon_root_attributes(size.x, size.y))
+    root.set("id", id)
+    
+    text_element = ET.SubElement(root, "text", {
+        "style": _text_icon_style(font.weight, font_size_px, font.family, foreground_color or "fg_main"),
         "x": number_to_str(size.x / 2),
         "y": number_to_str(centered_y),
         "text-anchor": "middle",
         "xml:space": "preserve",
     })
-    text_element.append(text_span_element)
     
-    root = ET.Element("svg", {
-        "id": id,
-        "viewBox": f"0 0 {" ".join(map(number_to_str, size))}",
-        "width": number_to_str(size.x),
-        "height": number_to_str(size.y),
-        "style": "overflow:visible;",
-    })
-    root.append(text_element)
+    text_span_element = ET.SubElement(text_element, "tspan")
+    text_span_element.text = text
     
     return SvgElement(root)
 
@@ -109,12 +166,15 @@ def create_icon_outline(geometry: KeycapGeometry, theme: Theme, templates: SvgSy
             
     surface_id = f"_{geometry.size_u()}-top"
     # A surface symbol is assumed to have a "-50 -50 100 100" viewbox
-    surface_symbol = templates[surface_id]
-    if isinstance(surface_symbol, Error):
+    surface_symbol = templates.symbols.get(surface_id)
+    if surface_symbol is None:
         panic(f"Given icon size did not have a corresponding entry in the templates file: could not find symbol element with id '{surface_id}'.")
-    outline = surface_symbol.source.element.find(".//path")
+    symbol_element = surface_symbol.source.element
+    outline = next((element for element in symbol_element.iter("path") if element is not symbol_element), None)
     if outline == None:
         panic(f"Found symbol with id {surface_id} did not have required path child element")
+    # Only the path is modified, so there's no need to copy the entire symbol.
+    outline = deepcopy(outline)
     element_apply_transform(outline, Transform(
         translate=center_pos,
         scale=surface_scaling,
@@ -190,7 +250,7 @@ class KeycapInfo:
         self.color_mappings = []
         self.foreground_color = None
         
-        if re.match(r".*->.*(;.*->.*)*", key.default_text_color):
+        if "->" in key.default_text_color:
             # This is sort of an abuse of the KLE format:
             # If the key foreground color is set to a string with the grammar
             # `<color-name> "->" <color-name> (";" <color-name> "->" <color-name>)*`,
@@ -200,6 +260,8 @@ class KeycapInfo:
             # Note: The replacements are done all at once, meaning that
             # for instance, if we have two mappings of X -> Y and Y -> Z, places
             # that use the color X will only be replaced by Y, and *not* Z.
+            if not _color_mappings_pattern.fullmatch(key.default_text_color):
+                panic(f"Key '{label}' had malformed color mappings '{key.default_text_color}', expected the form 'old->new(;old->new)*'")
             for mapping_str in key.default_text_color.split(";"):
                 old, new = mapping_str.split("->")
                 self.color_mappings.append((old, new))
@@ -227,31 +289,118 @@ class KeycapInfo:
             case Orientation.VERTICAL:
                 return Vec2(1, self.major_size)
 
+type _KeycapInfoCache = dict[tuple[str, float, float, str, str], KeycapInfo]
+
+# Keys which look the same get the same info, so they're shared between the keys
+# of a single pass over a layout, through the given cache. The cache is created
+# for each pass so that the shared infos don't outlive it.
+def _get_info(key: kle.Key, infos: _KeycapInfoCache) -> KeycapInfo:
+    cache_key = (key.labels[4].text, key.width, key.height, key.color, key.default_text_color)
+    info = infos.get(cache_key)
+    if info is None:
+        info = KeycapInfo(key)
+        infos[cache_key] = info
+    return info
+
 # Create mask for keycap bounding box
 def create_keycap_mask(size_u: str, base_size: float, config: Config) -> ET.Element:
+    return deepcopy(_build_keycap_mask(size_u, base_size, config.unit_size))
+
+# The same few masks are used by every factory, so only build them once. The
+# returned elements are shared and must be copied before being handed out.
+@functools.lru_cache(maxsize=64)
+def _build_keycap_mask(size_u: str, base_size: float, unit_size: float) -> ET.Element:
     id = f"_{size_u}-base"
     
     size = float(size_u.removesuffix("u"))
     
-    offset = (config.unit_size - base_size) / 2
-    width = config.unit_size * size - offset * 2
+    offset = (unit_size - base_size) / 2
+    width = unit_size * size - offset * 2
     height = base_size
     
-    rect = ET.Element("rect", {
-        "width": f"{width:g}",
-        "height": f"{height:g}",
-        "x": f"{offset:g}",
-        "y": f"{offset:g}",
+    mask = ET.Element("mask", {
+        "id": id,
+    })
+    ET.SubElement(mask, "rect", {
+        "width": number_to_str(width),
+        "height": number_to_str(height),
+        "x": number_to_str(offset),
+        "y": number_to_str(offset),
         "fill": "white",
     })
     
+    return mask
+
+@functools.lru_cache(maxsize=64)
+def _build_shading_mask(size_u: str, unit_size: float, top_size: float) -> ET.Element:
+    id = f"_{size_u}-shading"
+    
+    size = float(size_u.removesuffix("u"))
+    
+    offset = (unit_size - top_size) / 2
+    width = unit_size * size - offset * 2
+    height = top_size
+    
     mask = ET.Element("mask", {
         "id": id,
     })
-    mask.append(rect)
+    # Background
+    ET.SubElement(mask, "rect", {
+        "width": number_to_str(unit_size * size),
+        "height": number_to_str(unit_size),
+        "fill": "white",
+    })
+    # Top surface
+    ET.SubElement(mask, "use", {
+        "width": number_to_str(width),
+        "height": number_to_str(height),
+        "x": number_to_str(offset),
+        "y": number_to_str(offset),
+        "href": f"#_{size_u}-top",
+        "fill": "black",
+    })
     
     return mask
 
+# Get the attributes of a keycap's base rectangle, except for its fill. There
+# are only a few different key sizes, so these are only formatted once. The
+# returned dict is shared and must not be mutated.
+@functools.lru_cache(maxsize=64)
+def _base_rect_attributes(unit: float, margin: float, major_size: float) -> dict[str, str]:
+    attributes = {"class": "surface"}
+    if margin != 0:
+        attributes["x"] = number_to_str(-margin)
+        attributes["y"] = number_to_str(-margin)
+    attributes["width"] = number_to_str(unit * major_size + margin * 2)
+    attributes["height"] = number_to_str(unit + margin * 2)
+    return attributes
+
+# Insert an entry into a dict whose keys are kept in sorted order. Only meant for
+# the small mask dicts, which are read much more often than they are added to.
+def _insert_sorted[V](dictionary: dict[str, V], key: str, value: V) -> None:
+    dictionary[key] = value
+    items = sorted(dictionary.items(), key=lambda item: item[0])
+    dictionary.clear()
+    dictionary.update(items)
+
+# Every key refers to one of only a few colors and masks, so share the
+# attribute values between them instead of formatting a new string every time.
+@functools.lru_cache(maxsize=256)
+def _url_reference(id: str) -> str:
+    return f"url(#{id})"
+
+@functools.lru_cache(maxsize=256)
+def _keycap_color_class(color: str) -> str:
+    return f"keycap-color-{color}"
+
+# A keycap element as built by `KeycapFactory`, together with the definitions
+# that were added while building it. Shared between every key which looks the
+# same, so the element must be copied before being handed out.
+@dataclass
+class _BuiltKeycap:
+    element: SizedElement
+    defs: list[ET.Element]
+
 class OutlineOption(enum.IntEnum):
     EXCLUDE = 0
     INCLUDE_HIDDEN = 1
@@ -295,6 +444,8 @@ class KeycapFactory:
     _defs: DefsSet = field(init=False)
     _masks: dict[str, ET.Element] = field(default_factory=lambda: {})
     _shading_masks: dict[str, ET.Element] = field(default_factory=lambda: {})
+    _outlines: dict[tuple[KeycapGeometry, OutlineOption], ET.Element] = field(default_factory=lambda: {})
+    _keycaps: dict[tuple[Any, ...], _BuiltKeycap] = field(default_factory=lambda: {})
     
     def __post_init__(self):
         self._defs = DefsSet(
@@ -304,6 +455,8 @@ class KeycapFactory:
     def configure(self, options: KeycapRenderingOptions, key_templates: SvgSymbolSet|None = None) -> Self:
         self._options = options
         self._templates = key_templates
+        self._outlines.clear()
+        self._keycaps.clear()
         return self
     
     def _get_templates(self) -> SvgSymbolSet:
@@ -315,6 +468,28 @@ class KeycapFactory:
             panic("Keycap option set while no templates given")
         return self._templates
     
+    # Get a new copy of the outline for keys with the given geometry. Every key
+    # with the same geometry has an identical outline, so it's only created and
+    # transformed once.
+    def _create_outline(self, geometry: KeycapGeometry) -> ET.Element:
+        cache_key = (geometry, self._options.outline)
+        if (outline := self._outlines.get(cache_key)) is not None:
+            return deepcopy(outline)
+        
+        outline = create_icon_outline(
+            geometry,
+            self.config.as_theme(),
+            self._get_templates(),
+            stroke="red",
+        )
+        outline.set("class", "outline")
+        if self._options.outline is OutlineOption.INCLUDE_HIDDEN:
+            outline.set("visibility", "hidden")
+        element_apply_transform(outline, Transform(scale=Scaling(self.config.unit_size / 100)))
+        
+        self._outlines[cache_key] = outline
+        return deepcopy(outline)
+    
     # Creates a mask and return its id
     def _get_size_mask(self, size_u: str) -> str:
         if size_u in self._masks:
@@ -327,7 +502,7 @@ class KeycapFactory:
         
         mask = create_keycap_mask(size_u, size, self.config)
         
-        self._masks[size_u] = mask
+        _insert_sorted(self._masks, size_u, mask)
         return mask.attrib["id"]
     
     # Creates a mask and return its id
@@ -335,62 +510,82 @@ class KeycapFactory:
         if size_u in self._shading_masks:
             return self._shading_masks[size_u].attrib["id"]
         
-        id = f"_{size_u}-shading"
-        
-        size = float(size_u.removesuffix("u"))
-        
-        offset = (self.config.unit_size - self.config.top_size) / 2
-        width = self.config.unit_size * size - offset * 2
-        height = self.config.top_size
+        mask = deepcopy(_build_shading_mask(size_u, self.config.unit_size, self.config.top_size))
         
-        bg = ET.Element("rect", {
-            "width": f"{self.config.unit_size * size:g}",
-            "height": f"{self.config.unit_size:g}",
-            "fill": "white",
-        })
-        
-        top_surface = ET.Element("use", {
-            "width": f"{width:g}",
-            "height": f"{height:g}",
-            "x": f"{offset:g}",
-            "y": f"{offset:g}",
-            "href": f"#_{size_u}-top",
-            "fill": "black",
-        })
-        
-        mask = ET.Element("mask", {
-            "id": id,
-        })
-        mask.append(bg)
-        mask.append(top_surface)
-        
-        self._shading_masks[size_u] = mask
-        return id
+        _insert_sorted(self._shading_masks, size_u, mask)
+        return mask.attrib["id"]
     
     def get_defs(self) -> Iterable[ET.Element]:
         return itertools.chain(
-            (value for _, value in sorted(self._masks.items())),
-            (value for _, value in sorted(self._shading_masks.items())),
+            self._masks.values(),
+            self._shading_masks.values(),
             self._defs.defs,
         )
     
+    def create_standalone(self, key: KeycapInfo) -> tuple[SizedElement, list[ET.Element]]:
+        """
+        Create a keycap element like `create`, together with only the
+        definitions that it refers to, for placing it in a document of its own.
+        """
+        keycap = self._get_keycap(key)
+        
+        size_u = key.size_u()
+        defs = [self._masks[size_u]]
+        if size_u in self._shading_masks:
+            defs.append(self._shading_masks[size_u])
+        defs.extend(keycap.defs)
+        
+        return self._instantiate(keycap), defs
+    
     def create(self, key: KeycapInfo) -> SizedElement:
+        return self._instantiate(self._get_keycap(key))
+    
+    # Keyboards repeat the same few keycaps many times, so each distinct
+    # keycap is only built once.
+    def _get_keycap(self, key: KeycapInfo) -> _BuiltKeycap:
+        cache_key = (
+            key.icon_id,
+            key.major_size,
+            key.orientation,
+            key.color,
+            tuple(key.color_mappings),
+            key.foreground_color,
+        )
+        if (keycap := self._keycaps.get(cache_key)) is not None:
+            return keycap
+        
+        defs_start = len(self._defs.defs)
+        element = self._build(key)
+        keycap = _BuiltKeycap(element, self._defs.defs[defs_start:])
+        
+        self._keycaps[cache_key] = keycap
+        return keycap
+    
+    # Copy a built keycap, giving it its own id which the shading refers to.
+    def _instantiate(self, keycap: _BuiltKeycap) -> SizedElement:
+        group = deepcopy(keycap.element.element)
+        
+        id = get_unique_id("keycap-unshaded")
+        group[0].set("id", id)
+        if (shading := group.find("use")) is not None:
+            shading.set("href", f"#{id}")
+        
+        return SizedElement(group, copy(keycap.element.size))
+    
+    # Build the element of a keycap. The id of its unshaded group is left for
+    # `_instantiate` to fill in.
+    def _build(self, key: KeycapInfo) -> SizedElement:
         unit = self.config.unit_size
         margin = self.config.icon_margin
         
         dimensions = Scaling(unit)
-        match key.orientation:
-            case Orientation.HORIZONTAL:
-                dimensions.x *= key.major_size
-            case Orientation.VERTICAL:
-                dimensions.y *= key.major_size
-        
         frame_pos = Vec2[float](0, 0)
         frame_rotation = Rotation(0)
         match key.orientation:
             case Orientation.HORIZONTAL:
-                pass
+                dimensions.x *= key.major_size
             case Orientation.VERTICAL:
+                dimensions.y *= key.major_size
                 frame_rotation += 90
                 frame_pos.x += unit
         
@@ -400,18 +595,9 @@ class KeycapFactory:
             case _:
                 pass
         
-        base = make_element("rect", dict(
-            **{"class": "surface"},
-            x = f"{-margin:g}" if margin != 0 else None,
-            y = f"{-margin:g}" if margin != 0 else None,
-            width = f"{unit * key.major_size + margin * 2:g}",
-            height = f"{unit + margin * 2:g}",
-            fill = f"url(#{key.color})",
-        ))
-        
         # A 1u icon is an svg with a viewbox of "0 0 100 100" (assuming no
         # margin)
-        if (match := re.match(r"\[(.*)\]", key.icon_id)):
+        if key.icon_id.startswith("[") and (match := _icon_reference_pattern.match(key.icon_id)):
             id = match.group(1)
             icon = lookup_icon_id(id, self._defs)
             if icon is None:
@@ -424,63 +610,53 @@ class KeycapFactory:
                 key.color_mappings
             ))
             svg.tree_replace_in_attributes(icon.element, mappings)
-        icon.set_scale(Scaling(self.config.unit_size / 100))
+        icon.set_scale(Scaling(unit / 100))
         
         center_pos = dimensions.as_vec2() / 2
         icon_pos = center_pos - icon.size.as_vec2() / 2
         
-        icon.element.attrib["x"] = f"{icon_pos.x:g}"
-        icon.element.attrib["y"] = f"{icon_pos.y:g}"
+        icon.element.attrib["x"] = number_to_str(icon_pos.x)
+        icon.element.attrib["y"] = number_to_str(icon_pos.y)
         
         if self._options.outline is not OutlineOption.EXCLUDE:
-            outline = create_icon_outline(
-                key.geometry(),
-                self.config.as_theme(),
-                self._get_templates(),
-                stroke="red",
-            )
-            outline.set("class", "outline")
-            if self._options.outline is OutlineOption.INCLUDE_HIDDEN:
-                outline.set("visibility", "hidden")
-            element_apply_transform(outline, Transform(scale=Scaling(self.config.unit_size / 100)))
+            outline = self._create_outline(key.geometry())
         else:
             outline = None
         
-        icon_wrapper = ET.Element("g")
-        icon_wrapper.append(icon.element)
-        if outline is not None:
-            icon_wrapper.append(outline)
-        element_apply_transform(icon_wrapper, Placement(
-            translate=frame_pos.swap(),
-            rotate=-frame_rotation
-        ))
-        
-        unshaded_group = ET.Element("g", {
-            "id": get_unique_id("keycap-unshaded")
-        })
-        unshaded_group.append(base)
-        unshaded_group.append(icon_wrapper)
-        
-        if self._options.shading:
-            shading = ET.Element("use", {
-                "href": f"#{unshaded_group.get("id")}",
-                "mask": f"url(#{self._get_shading_mask(key.size_u())})",
-                "filter": "url(#sideShading)",
-            })
-        else:
-            shading = None
+        icon_elements = [icon.element] if outline is None else [icon.element, outline]
         
         group = ET.Element("g", {
-            "class": f"keycap-color-{key.color}",
-            "mask": f"url(#{self._get_size_mask(key.size_u())})",
+            "class": _keycap_color_class(key.color),
+            "mask": _url_reference(self._get_size_mask(key.size_u())),
         })
         element_apply_transform(group, Placement(
             translate=frame_pos,
             rotate=frame_rotation
         ))
-        group.append(unshaded_group)
-        if shading is not None:
-            group.append(shading)
+        
+        # The elements are created directly in their parents. The shared base
+        # attributes are copied by ElementTree, so only the fill is set here.
+        unshaded_group = ET.SubElement(group, "g", id="")
+        base = ET.SubElement(unshaded_group, "rect", _base_rect_attributes(unit, margin, key.major_size))
+        base.set("fill", _url_reference(key.color))
+        if frame_rotation.is_identity() and frame_pos.is_identity():
+            # The wrapper would have no transform, so leave it out to keep the
+            # document smaller.
+            unshaded_group.extend(icon_elements)
+        else:
+            icon_wrapper = ET.SubElement(unshaded_group, "g")
+            icon_wrapper.extend(icon_elements)
+            element_apply_transform(icon_wrapper, Placement(
+                translate=frame_pos.swap(),
+                rotate=-frame_rotation
+            ))
+        
+        if self._options.shading:
+            ET.SubElement(group, "use", {
+                "href": "",
+                "mask": _url_reference(self._get_shading_mask(key.size_u())),
+                "filter": "url(#sideShading)",
+            })
         
         return SizedElement(group, dimensions)
 
@@ -507,25 +683,23 @@ class PlacedComponent():
 def border_from_bounds(bounds: Bounds | svg.ViewBox) -> ET.Element:
     viewbox = svg.ViewBox.from_bounds(bounds) if isinstance(bounds, Bounds) else bounds
     return ET.Element("rect", {
-        "width": str(viewbox.size.get_x()),
-        "height": str(viewbox.size.get_y()),
-        "x": str(viewbox.pos.x),
-        "y": str(viewbox.pos.y),
+        "width": number_to_str(viewbox.size.get_x()),
+        "height": number_to_str(viewbox.size.get_y()),
+        "x": number_to_str(viewbox.pos.x),
+        "y": number_to_str(viewbox.pos.y),
         "stroke": "red",
         "fill": "rgba(255, 0, 0, 0.2)",
     })
 
 def place_keys[T](keys: Iterable[kle.Key], unit_size: float, placer: Callable[[KeycapInfo, Transform], T]) -> list[T]:
-    result: list[T] = []
-    for key in keys:
-        pos = resolve_key_position(key) * unit_size
-        
-        result.append(placer(KeycapInfo(key), Transform(
-            translate=pos,
+    infos: _KeycapInfoCache = {}
+    return [
+        placer(_get_info(key, infos), Transform(
+            translate=resolve_key_position(key, unit_size),
             rotate=Rotation(key.rotation_angle),
-        )))
-    
-    return result
+        ))
+        for key in keys
+    ]
 
 @dataclass
 class KeyboardBuilder():
@@ -576,10 +750,7 @@ class KeyboardBuilder():
         return self
     
     def build(self) -> ET.ElementTree[ET.Element]:
-        bounds = functools.reduce(
-            Bounds.combine,
-            (component.bounds() for component in self._components),
-        )
+        bounds = Bounds.combine_all(component.bounds() for component in self._components)
         
         viewbox = svg.ViewBox.from_bounds(bounds).add_padding(magic.padding)
 
@@ -603,7 +774,7 @@ class KeyboardBuilder():
                     .attributes(dict(
                         id="fonts",
                     ))
-                    .statement(*map(Font.generate_css_rule, self.config.font_family))
+                    .statement(*Font.generate_css_rules(self.config.font_family))
                     .build()
             )
         
@@ -636,7 +807,10 @@ def build_keyboard_svg(keyboard: kle.Keyboard, config: Config, key_templates: Sv
         .build())
 
 def pack_keys_for_print[Keyboard: kle.Keyboard](keyboard: Keyboard) -> Keyboard:
-    keyboard = deepcopy(keyboard)
+    # Only the positions of the keys are changed, so there's no need to deep copy
+    # everything else, like their labels.
+    keyboard = copy(keyboard)
+    keyboard.keys = [copy(key) for key in keyboard.keys]
     
     def geometry_to_size(geometry: tuple[float, Orientation]) -> Vec2[float]:
         size = Vec2(geometry[0], 1)
@@ -646,14 +820,11 @@ def pack_keys_for_print[Keyboard: kle.Keyboard](keyboard: Keyboard) -> Keyboard:
             case Orientation.VERTICAL:
                 return size.swap()
     
-    keys_by_geometry: dict[tuple[float, Orientation], list[kle.Key]] = {}
+    keys_by_geometry: defaultdict[tuple[float, Orientation], list[kle.Key]] = defaultdict(list)
+    infos: _KeycapInfoCache = {}
     for key in keyboard.keys:
-        info = KeycapInfo(key)
-        geometry = (info.major_size, info.orientation)
-        if geometry not in keys_by_geometry:
-            keys_by_geometry[geometry] = []
-        
-        keys_by_geometry[geometry].append(key)
+        info = _get_info(key, infos)
+        keys_by_geometry[(info.major_size, info.orientation)].append(key)
     
     next_y = 0
     for geometry, keys in keys_by_geometry.items():
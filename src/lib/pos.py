@@ -16,6 +16,7 @@ __all__ = [
     "Rotation",
     "Scaling",
     "rotate",
+    "cos_sin",
     "Bounds",
     "Box",
     "Orientation",
@@ -26,10 +27,12 @@ __all__ = [
 def clamp[T: float|int](value: T, min_value: T, max_value: T) -> T:
     return max(min_value, min(max_value, value))
 
-# Convert number to string, with integer valued floats not including a trailing
-# '.0' 
+# Convert number to string for use in svg attributes. Rounded to three decimals,
+# which is well below a pixel for any realistic size, with trailing zeros (and a
+# trailing '.') stripped.
 def number_to_str(number: float) -> str:
-    return str(number).removesuffix(".0")
+    result = f"{number:.3f}".rstrip("0").removesuffix(".")
+    return "0" if result == "-0" else result
 
 @dataclass
 class Vec3(Sequence[float]):
@@ -236,6 +239,13 @@ class Vec2[T: (float,int)]():
     def swap(self) -> Self:
         return type(self)(self.y, self.x)
 
+# Get the (cosine, sine) of an angle in degrees. Only a handful of angles are
+# used over and over again (mostly 0 and 90 degrees), so they're cached.
+@functools.lru_cache(maxsize=256)
+def cos_sin(angle_deg: float) -> tuple[float, float]:
+    angle_rad = math.radians(angle_deg)
+    return (math.cos(angle_rad), math.sin(angle_rad))
+
 @dataclass
 class Rotation:
     """
@@ -277,11 +287,12 @@ class Rotation:
         """
         Apply rotation to point, i.e. rotate point clockwise around origin."""
         
-        angle_rad = math.radians(self.deg)
+        cos, sin = cos_sin(self.deg)
+        x, y = point.x, point.y
         
         return Vec2(
-            math.cos(angle_rad) * point.x - math.sin(angle_rad) * point.y,
-            math.sin(angle_rad) * point.x + math.cos(angle_rad) * point.y,
+            cos * x - sin * y,
+            sin * x + cos * y,
         )
     
     @classmethod
@@ -377,13 +388,13 @@ def rotate(point: Vec2, origin: Vec2, angle: float) -> Vec2:
     The angle should be given in degrees.
     """
     
-    angle_rad = math.radians(angle)
+    cos, sin = cos_sin(angle)
     
     ox, oy = origin
-    px, py = point
+    dx, dy = point.x - ox, point.y - oy
 
-    qx = ox + math.cos(angle_rad) * (px - ox) - math.sin(angle_rad) * (py - oy)
-    qy = oy + math.sin(angle_rad) * (px - ox) + math.cos(angle_rad) * (py - oy)
+    qx = ox + cos * dx - sin * dy
+    qy = oy + sin * dx + cos * dy
     return Vec2(qx, qy)
 
 class Orientation(IntEnum):
@@ -487,6 +498,30 @@ class Bounds():
             max=Vec2(max(*x_components), max(*y_components))
         )
         
+    @classmethod
+    def combine_all(cls, bounds: Iterable[Bounds]) -> Self:
+        """
+        Combine all of the given bounds like `combine` in a single pass, without
+        creating any intermediate bounds. At least one bounds must be given.
+        """
+        
+        iterator = iter(bounds)
+        first = next(iterator, None)
+        if first is None:
+            panic("Can't combine an empty sequence of bounds")
+        
+        min_x = min(first.min.x, first.max.x)
+        min_y = min(first.min.y, first.max.y)
+        max_x = max(first.min.x, first.max.x)
+        max_y = max(first.min.y, first.max.y)
+        for other in iterator:
+            min_x = min(min_x, other.min.x, other.max.x)
+            min_y = min(min_y, other.min.y, other.max.y)
+            max_x = max(max_x, other.min.x, other.max.x)
+            max_y = max(max_y, other.min.y, other.max.y)
+        
+        return cls(min=Vec2(min_x, min_y), max=Vec2(max_x, max_y))
+    
     def __contains__(self, position: Vec2) -> bool:
         return (
             self.min.x <= position.x <= self.max.x
@@ -506,7 +541,8 @@ class Bounds():
         specified maximum size. The indices are 2 dimensional, and define the
         order in comparison to the other segments along the x and y axes
         individually.
-        The bounds are returned in an undefined order.
+        The bounds are returned in row-major order, i.e. ordered by their y index
+        and then by their x index.
         """
         
         cls = type(self)
@@ -556,24 +592,31 @@ class Box():
     def bounds(self) -> Bounds:
         min_corner = self.pos
         max_corner = self.pos + self.size.as_vec2()
-        corners = [
-            Vec2(min_corner.x, min_corner.y),
-            Vec2(min_corner.x, max_corner.y),
-            Vec2(max_corner.x, max_corner.y),
-            Vec2(max_corner.x, min_corner.y),
-        ]
-        
-        rotated = map(lambda pos: rotate(pos, self.rotation_origin, self.rotation.deg), corners)
-        
-        # Type system is not advanced enough to understand this :(
-        x_components, y_components = cast(
-            tuple[tuple[float, ...], tuple[float, ...]],
-            zip(*rotated)
-        )
+        
+        # Most boxes aren't rotated, in which case the corners are the bounds.
+        if self.rotation.deg == 0:
+            return Bounds(
+                min=Vec2(min(min_corner.x, max_corner.x), min(min_corner.y, max_corner.y)),
+                max=Vec2(max(min_corner.x, max_corner.x), max(min_corner.y, max_corner.y)),
+            )
+        
+        # The bounds of a rotated box are found from its rotated center and the
+        # extents of its rotated half size, without rotating every corner.
+        cos, sin = cos_sin(self.rotation.deg)
+        
+        half_width = (max_corner.x - min_corner.x) / 2
+        half_height = (max_corner.y - min_corner.y) / 2
+        dx = min_corner.x + half_width - self.rotation_origin.x
+        dy = min_corner.y + half_height - self.rotation_origin.y
+        center_x = self.rotation_origin.x + cos * dx - sin * dy
+        center_y = self.rotation_origin.y + sin * dx + cos * dy
+        
+        extent_x = abs(cos * half_width) + abs(sin * half_height)
+        extent_y = abs(sin * half_width) + abs(cos * half_height)
         
         return Bounds(
-            min=Vec2(min(*x_components), min(*y_components)),
-            max=Vec2(max(*x_components), max(*y_components))
+            min=Vec2(center_x - extent_x, center_y - extent_y),
+            max=Vec2(center_x + extent_x, center_y + extent_y),
         )
 
 @dataclass
@@ -601,16 +644,22 @@ class CubicBezierSegment():
         
         def elliptic_arc_point(center: Vec2[float], radius: Vec2[float], x_axis_angle: Rotation, angle: Rotation) -> Vec2[float]:
             """Get point along the ellipses that is `angle` clockwise along from uhh somewhere."""
+            # The x axis angle is the same for every point of the arc, so its
+            # trigonometry is cached, while the angle along it changes.
+            axis_cos, axis_sin = cos_sin(x_axis_angle.deg)
+            cos, sin = math.cos(angle.rad()), math.sin(angle.rad())
             return Vec2(
-                center.x + radius.x * math.cos(x_axis_angle.rad()) * math.cos(angle.rad()) - radius.y * math.sin(x_axis_angle.rad()) * math.sin(angle.rad()),
-                center.y + radius.x * math.sin(x_axis_angle.rad()) * math.cos(angle.rad()) + radius.y * math.cos(x_axis_angle.rad()) * math.sin(angle.rad())
+                center.x + radius.x * axis_cos * cos - radius.y * axis_sin * sin,
+                center.y + radius.x * axis_sin * cos + radius.y * axis_cos * sin
             )
         def elliptic_arc_point_derivative(center: Vec2[float], radius: Vec2[float], x_axis_angle: Rotation, angle: Rotation) -> Vec2[float]:
             """The derivative of elliptic_arc_point with respects to `angle`"""
             # Generated with ChatGPT :) 
+            axis_cos, axis_sin = cos_sin(x_axis_angle.deg)
+            cos, sin = math.cos(angle.rad()), math.sin(angle.rad())
             return Vec2(
-                -radius.x * math.cos(x_axis_angle.rad()) * math.sin(angle.rad()) - radius.y * math.sin(x_axis_angle.rad()) * math.cos(angle.rad()),
-                -radius.x * math.sin(x_axis_angle.rad()) * math.sin(angle.rad()) + radius.y * math.cos(x_axis_angle.rad()) * math.cos(angle.rad())
+                -radius.x * axis_cos * sin - radius.y * axis_sin * cos,
+                -radius.x * axis_sin * sin + radius.y * axis_cos * cos
             )
         
         def approximate_single(center: Vec2[float], radius: Vec2[float], x_axis_angle: Rotation, start_angle: Rotation, end_angle: Rotation) -> Self:
@@ -3,7 +3,8 @@ from typing import *
 from pathlib import Path
 from dataclasses import dataclass
 import tempfile
-import subprocess
+import io
+import PIL.Image
 import xml.etree.ElementTree as ET 
 
 from . import action
@@ -31,22 +32,39 @@ class ImageTileMap():
     finish the operation. Is separate to allow easy measurement of how long the
     two stages take.
     """
-    dir: tempfile.TemporaryDirectory
-    paths: Iterator[Path]
+    dir: tempfile.TemporaryDirectory | None
+    tiles: Iterable[Path | bytes]
+    """
+    The PNG tiles, either as files or their contents, in row-major order.
+    """
     count: Vec2[int]
     out_path: Path
     
     def stich_together(self) -> None:
-        subprocess.check_call([
-            "magick", "montage",
-            *self.paths,
-            "-mode", "Concatenate",
-            "-tile", f"{self.count.x}x{self.count.y}",
-            "-background", "none",
-            self.out_path,
-        ])
+        tiles = [
+            PIL.Image.open(tile if isinstance(tile, Path) else io.BytesIO(tile))
+            for tile in self.tiles
+        ]
+        
+        # All tiles in a column have the same width, and all tiles in a row
+        # have the same height.
+        widths = [tile.width for tile in tiles[:self.count.x]]
+        heights = [tiles[row * self.count.x].height for row in range(self.count.y)]
         
-        self.dir.cleanup()
+        result = PIL.Image.new("RGBA", (sum(widths), sum(heights)), (0, 0, 0, 0))
+        y = 0
+        for row in range(self.count.y):
+            x = 0
+            for column in range(self.count.x):
+                result.paste(tiles[row * self.count.x + column], (x, y))
+                x += widths[column]
+            y += heights[row]
+        result.save(self.out_path)
+        
+        for tile in tiles:
+            tile.close()
+        if self.dir is not None:
+            self.dir.cleanup()
 
 type SegmentRenderer = Callable[[Bounds, Path], None]
 
@@ -60,21 +78,19 @@ def render_segmented(
 ) -> ImageTileMap:
     temp_dir = tempfile.TemporaryDirectory()
     directory = Path(temp_dir.name)
-    indices = list[Vec2[int]]()
+    # `as_segments` yields the segments in row-major order, so the first n
+    # paths constitute the first row, the second constitute the second row and
+    # so on.
+    paths = list[Path]()
+    max_index = Vec2[int](0, 0)
     pairs = tuple(area.as_segments(max_segment_size.cast_to(int)))
     for index, (index_pair, segment) in enumerate(pairs):
         if progress_handler is not None:
             progress_handler(TileRenderProgress(index, len(pairs)))
-        segment_renderer(segment, directory / f"{index_pair.x}_{index_pair.y}.png")
-        indices.append(index_pair)
-    
-    # Sorted, so that the first n items constitutes the first row, the second
-    # constitutes the second row and so on.
-    indices_sorted = sorted(indices, key=lambda pair: tuple(pair[::-1]))
-    paths = map(
-        lambda pair: directory / f"{pair.x}_{pair.y}.png", 
-        indices_sorted
-    )
-    count = Vec2[int].max(*indices) + Vec2(1, 1)
+        segment_path = directory / f"{index_pair.x}_{index_pair.y}.png"
+        segment_renderer(segment, segment_path)
+        paths.append(segment_path)
+        max_index = Vec2(max(max_index.x, index_pair.x), max(max_index.y, index_pair.y))
+    count = max_index + Vec2(1, 1)
     
     return ImageTileMap(temp_dir, paths, count, path)
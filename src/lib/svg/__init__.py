@@ -8,6 +8,7 @@ import io
 import subprocess
 import re
 import itertools
+import functools
 import xml.etree.ElementTree as ET 
 from playwright import sync_api as playwright
 
@@ -47,6 +48,7 @@ __all__ = [
     "basic_shape_pre_transform_bounds",
     "apply_transform_origin",
     "tree_to_str",
+    "file_get_viewbox",
     "render_file_as_png",
     "render_file_as_png_segmented_resvg",
 ]
@@ -108,8 +110,13 @@ def string_replace_mappings(string: str, mappings: Dict[str, str]) -> str:
         # actually does anything, but I don't care :)
         return string
     
-    pattern = "|".join(map(re.escape, mappings.keys()))
-    return re.sub(pattern, lambda match: mappings[match.group(0)], string)
+    return _mappings_pattern(tuple(mappings.keys())).sub(lambda match: mappings[match.group(0)], string)
+
+# Get a pattern matching any of the given strings. The same few color mappings
+# are used by many keys, so only compile each once.
+@functools.lru_cache(maxsize=64)
+def _mappings_pattern(keys: tuple[str, ...]) -> re.Pattern[str]:
+    return re.compile("|".join(map(re.escape, keys)))
 
 def tree_get_id(tree: MaybeElementTree, id: str) -> ET.Element|None:
     for element in resolve_element_tree(tree).iter():
@@ -196,10 +203,20 @@ def tree_replace_in_attributes(tree: MaybeElementTree, mappings: Dict[str, str])
     replacements are done in place, meaning that later mappings won't replace
     the values inserted by earlier mappings.
     """
-    tree_map_attributes(
-        tree,
-        lambda _, value: string_replace_mappings(value, mappings)
-    )
+    if len(mappings) == 0:
+        return
+    
+    # Build the pattern once for the whole tree, instead of for every value.
+    pattern = _mappings_pattern(tuple(mappings.keys()))
+    def replace(match: re.Match[str]) -> str:
+        return mappings[match.group(0)]
+    
+    for element in resolve_element_tree(tree).iter():
+        attributes = element.attrib
+        for name, value in attributes.items():
+            new_value = pattern.sub(replace, value)
+            if new_value != value:
+                attributes[name] = new_value
 
 def tree_remove_unreferenced_ids(tree: MaybeElementTree) -> None:
     """
@@ -260,6 +277,17 @@ def tree_get_viewbox(tree: MaybeElementTree) -> ViewBox:
         case Error(reason):
             panic(f"Tree svg element contained invalid viewBox '{root.attrib["viewBox"]}': {reason}")
 
+def file_get_viewbox(path: Path) -> ViewBox:
+    """
+    Read the viewBox of the root svg element of the file at `path`, without
+    parsing the rest of the document.
+    """
+    
+    with open(path, "rb") as file:
+        for _, root in ET.iterparse(file, events=("start",)):
+            return tree_get_viewbox(root)
+    panic(f"'{path}' did not contain any elements")
+
 def tree_set_viewbox(tree: MaybeElementTree, value: ViewBox) -> None:
     root = resolve_element_tree(tree)
     
@@ -315,11 +343,7 @@ def parse_transform_origin(origin_str: str) -> Result[tuple[float | Percentage,
             return Ok((x, y))
 
 def get_css_property(element: ET.Element, property: str) -> str | None:
-    styles = CssStyles.from_style(element.get("style", ""))
-    if property in styles:
-        return styles[property]
-    else:
-        return None
+    return CssStyles.from_style(element.get("style", "")).get(property)
 
 def append_css_properties(element: ET.Element, properties: CssStyles) -> None:
     styles = CssStyles(CssStyles.from_style(element.get("style", "")) | properties)
@@ -649,8 +673,7 @@ def render_file_as_png(page: playwright.Page, svg_path: Path, out_path: Path, sc
 @overload
 def render_file_as_png(page: playwright.Page, svg_path: Path, out_path: Path, scale: float) -> None: ...
 def render_file_as_png(page: playwright.Page, svg_path: Path, out_path: Path, scale: float, max_tile_size: Vec2[int]|None = None, *, progress_handler: Callable[[render.TileRenderProgress], None]|None = None) -> render.ImageTileMap|None:
-    svg = ET.parse(svg_path)
-    view_box = tree_get_viewbox(svg)
+    view_box = file_get_viewbox(svg_path)
     
     page.set_viewport_size({
         'width': int(view_box.size.get_x() * scale),
@@ -666,8 +689,7 @@ def render_file_as_png(page: playwright.Page, svg_path: Path, out_path: Path, sc
         return None
 
 def render_file_as_pdf(page: playwright.Page, svg_path: Path, out_path: Path, scale: float):
-    svg = ET.parse(svg_path)
-    view_box = tree_get_viewbox(svg)
+    view_box = file_get_viewbox(svg_path)
 
     width = int(view_box.size.get_x() * scale)
     height = int(view_box.size.get_y() * scale)
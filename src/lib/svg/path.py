@@ -380,7 +380,7 @@ class EllipticalArc(PathCommand):
             segement_min_degrees=45,
         )
         
-        next_bounds = functools.reduce(Bounds.combine, map(Bounds.from_cubic_bezier, segments))
+        next_bounds = Bounds.combine_all(map(Bounds.from_cubic_bezier, segments))
         
         return state.update(
             next_position,
@@ -5,6 +5,7 @@ from copy import copy, deepcopy
 import re
 import xml.etree.ElementTree as ET
 import itertools
+import functools
 
 from .error import *
 from .utils import *
@@ -42,6 +43,8 @@ NS = {
     "bx": "https://boxy-svg.com",
 }
 
+_url_namespaces = dict((url, namespace) for namespace, url in NS.items())
+
 for namespace, url in NS.items():
     ET.register_namespace(namespace, url)
 
@@ -65,8 +68,12 @@ def get_similar_unique_ids(id: str, existing_ids: set[str]) -> str:
 
 # label_raw can either be a tag name or attribute name. If it has a namespace it should be
 # in the form '{namespace_url}label'.
+# The same few labels are resolved over and over again, so the results are cached.
+@functools.cache
 def resolve_label(label_raw: str) -> str:
-    namespaces = NS
+    if not label_raw.startswith("{"):
+        # There's no namespace to resolve.
+        return label_raw
     
     result = re.search(r"^(?:\{(.*)\})?(.*)$", label_raw)
     if result == None:
@@ -76,27 +83,27 @@ def resolve_label(label_raw: str) -> str:
     if url == None:
         return name
     
-    url_namespaces = dict(map(lambda pair: (pair[1], pair[0]), namespaces.items()))
-    
-    if url not in url_namespaces:
+    if url not in _url_namespaces:
         # It's better to preserve any unknown namespaces.
         return label_raw
     
-    if url_namespaces[url] == "":
+    if _url_namespaces[url] == "":
         return name
     else:
-        return f"{url_namespaces[url]}:{name}"
+        return f"{_url_namespaces[url]}:{name}"
 
 def element_resolve_namespaces(element: ET.Element) -> None:
     element.tag = resolve_label(element.tag)
-    element.attrib = dict((resolve_label(name), value) for name, value in element.attrib.items())
+    # Most attributes don't have a namespace, so avoid rebuilding the attributes
+    # when there's nothing to resolve.
+    if any(name.startswith("{") for name in element.attrib):
+        element.attrib = dict((resolve_label(name), value) for name, value in element.attrib.items())
 
 def tree_resolve_namespaces(tree: svg.MaybeElementTree) -> None:
     root = tree.getroot() if isinstance(tree, ET.ElementTree) else tree
     
-    element_resolve_namespaces(root)
-    for child in root.findall(".//*"):
-        element_resolve_namespaces(child)
+    for element in root.iter():
+        element_resolve_namespaces(element)
 
 def make_element(tag: str, attributes: dict[str, str|None], children: Iterable[ET.Element] = []) -> ET.Element:
     """
@@ -391,7 +398,9 @@ class Transform:
         if self.rotate != None and not self.rotate.is_identity():
             transforms.append(f"rotate({self.rotate.deg:g})")
         if self.scale != None and not self.scale.is_identity():
-            transforms.append(f"scale({", ".join(map(number_to_str, self.scale))})")
+            # Scale factors multiply every coordinate, so they're kept at full
+            # precision instead of being rounded like lengths are.
+            transforms.append(f"scale({", ".join(repr(factor).removesuffix(".0") for factor in self.scale)})")
         return " ".join(transforms)
         
     @classmethod
@@ -448,8 +457,8 @@ class SvgElement(SizedElement):
         
         self.size = size
         size = size.promote_to_pair()
-        self.element.attrib["width"] = str(size.x)
-        self.element.attrib["height"] = str(size.y)
+        self.element.attrib["width"] = number_to_str(size.x)
+        self.element.attrib["height"] = number_to_str(size.y)
 
 class SvgSymbol:
     id: str
@@ -637,10 +646,23 @@ class SvgDocumentBuilder:
         self.viewbox = viewbox
         return self
     
+    def fork_shallow(self) -> SvgDocumentBuilder:
+        """
+        Create a new builder with the same configuration, which elements can be
+        added to without affecting this builder. Note that the already added
+        elements and the palette are shared between the builders, not copied.
+        """
+        result = SvgDocumentBuilder()
+        result.elements = list(self.elements)
+        result._root_styles = CssStyles(self._root_styles)
+        result._palette = self._palette
+        result.viewbox = self.viewbox
+        return result
+    
     def build(self) -> ET.ElementTree[ET.Element]:
         if self.viewbox == None:
             panic("You must set a viewbox!")
-        viewbox_str = f"{self.viewbox.pos.x:g} {self.viewbox.pos.y:g} {self.viewbox.size.x:g} {self.viewbox.size.y:g}"
+        viewbox_str = " ".join(map(number_to_str, (self.viewbox.pos.x, self.viewbox.pos.y, self.viewbox.size.x, self.viewbox.size.y)))
         
         def transform_namespace(pair: tuple[str, str]) -> tuple[str, str]:
             namespace, url = pair
@@ -3,6 +3,7 @@ import collections.abc
 import sys
 import traceback
 import os
+from pathlib import Path
 
 __all__ = [
     "eprint",
@@ -13,6 +14,7 @@ __all__ = [
     "assert_instance",
     "inspect",
     "time_it",
+    "cache_directory",
 ]
 
 def eprint(*args, **kwargs):
@@ -74,7 +76,7 @@ class WriteHooked[T: (str, bytes)](IO[T]):
     
     def __getattribute__(self, name: str) -> None:
         match name:
-            case "file", "on_write" | "write":
+            case "file" | "on_write" | "write":
                 return super().__getattribute__(name)
             case _:
                 return getattr(super().__getattribute__("file"), name)
@@ -88,8 +90,17 @@ class WriteHooked[T: (str, bytes)](IO[T]):
         self.on_write(result)
         return result
 
-class WriteTracker(TextIO):
-    # TODO: For some reason this makes `fileno` attribute be `None`.
+class WriteTracker():
+    """
+    Wraps a text stream, counting the amount of writes made to it (including
+    writes to its underlying `buffer`). Everything else is forwarded to the
+    wrapped stream.
+    """
+    __slots__ = ("file", "write_amount")
+    
+    file: TextIO
+    write_amount: int
+    
     def __init__(self, file: TextIO) -> None:
         self.file = file
         self.write_amount = 0
@@ -101,19 +112,22 @@ class WriteTracker(TextIO):
             case _:
                 self.file.__setattr__(name, value)
     
-    # Called for *every* access
-    def __getattribute__(self, name: str) -> Any:
-        match name:
-            case "buffer":
-                def on_write(amount: int) -> None:
-                    self.write_amount += amount
-                return WriteHooked(self.file.buffer, on_write)
-            case "file" | "write_amount" | "write":
-                return super().__getattribute__(name)
-            case _:
-                return getattr(super().__getattribute__("file"), name)
+    # Only called for attributes which aren't found on the tracker itself.
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.file, name)
+    
+    @property
+    def buffer(self) -> IO[bytes]:
+        def on_write(_: int) -> None:
+            self.write_amount += 1
+        return WriteHooked(self.file.buffer, on_write)
     
     def write(self, s: str) -> int:
-        result = self.file.write(s)
-        self.write_amount += result
-        return result
+        self.write_amount += 1
+        return self.file.write(s)
+
+def cache_directory() -> Path:
+    """
+    The directory to store files cached between invocations in.
+    """
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "kittencaps"
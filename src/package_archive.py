@@ -115,17 +115,26 @@ def main() -> None:
     
     layout = keyboard_builder.pack_keys_for_print(layout)
     
-    file = action.log_action(
-        "Generating ZIP archive",
-        lambda handler: archive.package_keycap_icons_archive(
-            layout,
-            config,
-            key_templates,
-            progress_handler=handler,
-        ),
-    )
-    
-    out.write_bytes(file.getbuffer())
+    # The archive is streamed into a temporary file next to the output, which
+    # only replaces the output once it's complete, so that a failed build
+    # doesn't leave a truncated archive in place of the previous one.
+    temporary_out = out.with_suffix(".zip.tmp")
+    try:
+        with open(temporary_out, "wb") as file:
+            action.log_action(
+                "Generating ZIP archive",
+                lambda handler: archive.package_keycap_icons_archive(
+                    layout,
+                    config,
+                    key_templates,
+                    file,
+                    progress_handler=handler,
+                ),
+            )
+        temporary_out.replace(out)
+    except BaseException:
+        temporary_out.unlink(missing_ok=True)
+        raise
     
     print(f"\nDone in {timer.get_pretty()}")
 